@@ -66,6 +66,8 @@ app.use('/api/beacon', beaconRoutes);
 // Initialize Gemini AI client
 const apiKey = process.env.GEMINI_API_KEY || process.env.VITE_GEMINI_API_KEY;
 let genAI: GoogleGenerativeAI | null = null;
+// Optional override so load tests can point Gemini calls at a local stand-in
+const geminiRequestOptions = process.env.GEMINI_BASE_URL ? { baseUrl: process.env.GEMINI_BASE_URL } : undefined;
 
 if (apiKey) {
   genAI = new GoogleGenerativeAI(apiKey);
@@ -112,7 +114,7 @@ app.post('/gemini', async (req, res) => {
     ].join('\n\n');
 
     // Use SDK instead of REST API
-    const generativeModel = genAI.getGenerativeModel({ model });
+    const generativeModel = genAI.getGenerativeModel({ model }, geminiRequestOptions);
     const result = await generativeModel.generateContent(fullPrompt);
     const response = await result.response;
     const text = response.text();
@@ -143,7 +145,7 @@ app.post('/gemini', async (req, res) => {
           'Return 2-4 bullets: sights, suggested flow, food, and a one-line value tip.',
         ].join('\n\n');
         
-        const generativeModel = genAI!.getGenerativeModel({ model: fallbackModel });
+        const generativeModel = genAI!.getGenerativeModel({ model: fallbackModel }, geminiRequestOptions);
         const result = await generativeModel.generateContent(fullPrompt);
         const response = await result.response;
         const text = response.text();
@@ -36,7 +36,10 @@ class GeminiService {
     }
 
     try {
-      const generativeModel = this.genAI.getGenerativeModel({ model });
+      const generativeModel = this.genAI.getGenerativeModel(
+        { model },
+        process.env.GEMINI_BASE_URL ? { baseUrl: process.env.GEMINI_BASE_URL } : undefined
+      );
       const result = await generativeModel.generateContent(prompt);
       const response = await result.response;
       const text = response.text();
@@ -128,7 +131,7 @@ The story should feel story-like, conversational, and vivid, while still being h
     };
 
     const response = await axios.post(
-      `https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key=${process.env.GEMINI_API_KEY}`,
+      `${process.env.GEMINI_BASE_URL || 'https://generativelanguage.googleapis.com'}/v1beta/models/gemini-2.5-flash:generateContent?key=${process.env.GEMINI_API_KEY}`,
       requestBody,
       {
         headers: {
@@ -0,0 +1,322 @@
+"""
+Active Learning for the YatriAI Intent Classifier
+
+Streams production chat queries from a JSONL export, scores them in large
+batches with the current intent classifier and queues the most uncertain
+(margin or entropy of the calibrated softmax) and most diverse (greedy
+farthest-point over sentence embeddings) queries for labeling. Labeled
+queries are then merged back into the training set.
+
+Log format: one JSON object per line with a "query", "text" or "message"
+field (a bare JSON string per line also works).
+
+Workflow:
+    python scripts/active_learning.py select --log exports/chat_queries.jsonl --budget 50
+    # fill in "intent" for each entry in training_data/labeling_queue.json
+    python scripts/active_learning.py merge
+    python scripts/train_models.py --model intent --incremental
+"""
+
+import argparse
+import heapq
+import json
+import re
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from evaluate_models import MODELS_DIR, TRAINING_DATA_DIR, predict_logits, softmax
+from run_profiler import RunProfiler, add_profile_arguments
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+LABELING_QUEUE_FILE = TRAINING_DATA_DIR / "labeling_queue.json"
+LABELED_QUERIES_FILE = TRAINING_DATA_DIR / "labeled_queries.json"
+LOG_TEXT_FIELDS = ("query", "text", "message")
+EMBEDDINGS_FALLBACK_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+DEFAULT_BUDGET = 50
+SCORE_BATCH_SIZE = 256
+POOL_FACTOR = 10  # Uncertain candidates kept per labeling slot before diversity selection
+
+
+def normalize_text(text):
+    """Normalize a query for de-duplication"""
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+def load_json_list(path):
+    """Load a JSON list, or [] when the file does not exist"""
+    if not path.exists():
+        return []
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_log_queries(log_file):
+    """Yield query texts from a JSONL log, skipping malformed lines"""
+    with open(log_file, "r", encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, str):
+                text = record
+            elif isinstance(record, dict):
+                text = next((record[k] for k in LOG_TEXT_FIELDS if isinstance(record.get(k), str)), None)
+            else:
+                text = None
+            if text and text.strip():
+                yield text.strip()
+
+
+def iter_batches(items, size):
+    """Group an iterable into lists of at most `size` items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def uncertainty_scores(probs, strategy="margin"):
+    """Per-row uncertainty in [0, 1]: 1 - (top1 - top2) or normalized entropy"""
+    if strategy == "entropy":
+        entropy = -np.sum(probs * np.log(probs + 1e-12), axis=1)
+        return entropy / np.log(probs.shape[1])
+    top2 = np.sort(probs, axis=1)[:, -2:]
+    return 1.0 - (top2[:, 1] - top2[:, 0])
+
+
+def select_diverse(embeddings, uncertainty, budget, reference_embeddings=None):
+    """Greedily pick rows maximizing uncertainty x distance to everything already covered"""
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    if reference_embeddings is not None and len(reference_embeddings):
+        reference = reference_embeddings / np.linalg.norm(reference_embeddings, axis=1, keepdims=True)
+        max_sim = (embeddings @ reference.T).max(axis=1)
+    else:
+        max_sim = np.zeros(len(embeddings))
+
+    selected = []
+    available = np.ones(len(embeddings), dtype=bool)
+    for _ in range(min(budget, len(embeddings))):
+        gain = np.where(available, uncertainty * (1.0 - np.clip(max_sim, 0.0, 1.0)), -np.inf)
+        pick = int(np.argmax(gain))
+        selected.append(pick)
+        available[pick] = False
+        max_sim = np.maximum(max_sim, embeddings @ embeddings[pick])
+    return selected
+
+
+def load_embedding_model():
+    """Load the fine-tuned embeddings model, or the base model when it is missing"""
+    from sentence_transformers import SentenceTransformer
+
+    model_path = MODELS_DIR / "heritage-embeddings"
+    return SentenceTransformer(str(model_path) if model_path.exists() else EMBEDDINGS_FALLBACK_MODEL)
+
+
+def select_queries(log_file, budget=DEFAULT_BUDGET, strategy="margin", batch_size=SCORE_BATCH_SIZE,
+                   pool_factor=POOL_FACTOR, profiler=None):
+    """Score logged queries and write the most uncertain, diverse ones to the labeling queue"""
+    print("=" * 60)
+    print("ACTIVE LEARNING: SELECTING QUERIES FOR LABELING")
+    print("=" * 60)
+    profiler = profiler or RunProfiler("active_learning")
+
+    try:
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("ERROR: Please install required packages:")
+        print("   pip install transformers sentence-transformers torch")
+        return None
+
+    model_path = MODELS_DIR / "intent-classifier"
+    if not model_path.exists():
+        print(f"ERROR: Model not found at {model_path}")
+        return None
+
+    with profiler.stage("load_classifier"):
+        tokenizer = AutoTokenizer.from_pretrained(str(model_path))
+        model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
+        model.eval()
+        with open(model_path / "intent_mapping.json", "r", encoding='utf-8') as f:
+            id_to_intent = {int(k): v for k, v in json.load(f)["id_to_intent"].items()}
+        temperature = 1.0
+        calibration_file = model_path / "calibration.json"
+        if calibration_file.exists():
+            with open(calibration_file, "r", encoding='utf-8') as f:
+                temperature = json.load(f)["temperature"]
+    print(f"Scoring with temperature {temperature:.4f}, strategy '{strategy}'")
+
+    # Skip anything already labeled or already waiting in the queue
+    training_data = load_json_list(TRAINING_DATA_DIR / "intent_data.json")
+    queue = load_json_list(LABELING_QUEUE_FILE)
+    seen = {normalize_text(item["text"]) for item in training_data + load_json_list(LABELED_QUERIES_FILE) + queue}
+
+    # Log duplicates are only tracked while they sit in the candidate pool, so
+    # memory stays bounded by the pool size however large the log is. A query
+    # evicted from the pool can never re-enter it: it would score the same and
+    # the pool minimum only rises.
+    pool_size = budget * pool_factor
+    pool = []
+    pool_keys = set()
+    scored = 0
+
+    def unseen_queries():
+        for text in iter_log_queries(log_file):
+            key = normalize_text(text)
+            if key not in seen and key not in pool_keys:
+                yield text
+
+    with profiler.stage("score_queries"):
+        for batch in iter_batches(unseen_queries(), batch_size):
+            probs = softmax(predict_logits(model, tokenizer, batch, batch_size=batch_size, profiler=profiler), temperature)
+            uncertainty = uncertainty_scores(probs, strategy)
+            top2 = np.sort(probs, axis=1)[:, -2:]
+            for i, text in enumerate(batch):
+                scored += 1
+                key = normalize_text(text)
+                if key in pool_keys:
+                    continue
+                entry = (float(uncertainty[i]), scored, {
+                    "text": text,
+                    "predicted_intent": id_to_intent[int(np.argmax(probs[i]))],
+                    "confidence": float(top2[i, 1]),
+                    "margin": float(top2[i, 1] - top2[i, 0]),
+                    "uncertainty": float(uncertainty[i]),
+                })
+                if len(pool) < pool_size:
+                    heapq.heappush(pool, entry)
+                elif entry[0] > pool[0][0]:
+                    evicted = heapq.heapreplace(pool, entry)
+                    pool_keys.discard(normalize_text(evicted[2]["text"]))
+                else:
+                    continue
+                pool_keys.add(key)
+    print(f"Scored {scored} new queries, kept {len(pool)} uncertain candidates")
+    profiler.record("queries_scored", scored)
+
+    if not pool:
+        print("WARNING: No new queries to label")
+        return []
+
+    candidates = [entry[2] for entry in pool]
+    with profiler.stage("diversity_selection"):
+        embedding_model = load_embedding_model()
+        candidate_embeddings = embedding_model.encode([c["text"] for c in candidates], batch_size=batch_size)
+        labeled_embeddings = embedding_model.encode([item["text"] for item in training_data], batch_size=batch_size)
+        chosen = select_diverse(
+            np.asarray(candidate_embeddings),
+            np.array([c["uncertainty"] for c in candidates]),
+            budget,
+            np.asarray(labeled_embeddings),
+        )
+
+    selected = [dict(candidates[i], intent=None) for i in chosen]
+    with open(LABELING_QUEUE_FILE, "w", encoding='utf-8') as f:
+        json.dump(queue + selected, f, indent=2, ensure_ascii=False)
+
+    print(f"\nSelected {len(selected)} queries for labeling")
+    print(f"   Mean uncertainty: {np.mean([s['uncertainty'] for s in selected]):.4f}")
+    for intent, count in Counter(s["predicted_intent"] for s in selected).most_common():
+        print(f"   predicted {intent}: {count}")
+    print(f"\nLabeling queue saved to: {LABELING_QUEUE_FILE}")
+    print("Next step: set \"intent\" on each entry, then run")
+    print("   python scripts/active_learning.py merge")
+    profiler.record("queries_selected", len(selected))
+    return selected
+
+
+def merge_labels(queue_file=LABELING_QUEUE_FILE):
+    """Merge labeled queue entries into intent_data.json and labeled_queries.json"""
+    print("=" * 60)
+    print("ACTIVE LEARNING: MERGING LABELS")
+    print("=" * 60)
+
+    queue = load_json_list(queue_file)
+    labeled = [item for item in queue if item.get("intent")]
+    if not labeled:
+        print(f"WARNING: No labeled entries in {queue_file}")
+        return 0
+
+    intent_file = TRAINING_DATA_DIR / "intent_data.json"
+    training_data = load_json_list(intent_file)
+    known_intents = set(item["intent"] for item in training_data)
+    new_intents = sorted(set(item["intent"] for item in labeled) - known_intents)
+    if new_intents:
+        print(f"⚠️  New intents {new_intents}: the next training run will retrain from the base model")
+
+    labeled_queries = load_json_list(LABELED_QUERIES_FILE)
+    seen = {normalize_text(item["text"]) for item in training_data}
+    added = []
+    for item in labeled:
+        if normalize_text(item["text"]) not in seen:
+            seen.add(normalize_text(item["text"]))
+            added.append({"text": item["text"], "intent": item["intent"]})
+
+    # labeled_queries.json survives prepare_training_data.py regenerating intent_data.json
+    with open(LABELED_QUERIES_FILE, "w", encoding='utf-8') as f:
+        json.dump(labeled_queries + added, f, indent=2, ensure_ascii=False)
+    with open(intent_file, "w", encoding='utf-8') as f:
+        json.dump(training_data + added, f, indent=2, ensure_ascii=False)
+    with open(queue_file, "w", encoding='utf-8') as f:
+        json.dump([item for item in queue if not item.get("intent")], f, indent=2, ensure_ascii=False)
+
+    corrected = sum(1 for item in labeled if item["intent"] != item.get("predicted_intent"))
+    print(f"✅ Merged {len(added)} labeled queries ({len(labeled) - len(added)} duplicates skipped)")
+    print(f"   Classifier was wrong on {corrected}/{len(labeled)} labeled queries")
+    print(f"   Training examples: {len(training_data) + len(added)}")
+    print("\nNext step: fine-tune on the new examples")
+    print("   python scripts/train_models.py --model intent --incremental")
+    return len(added)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Active learning for the YatriAI intent classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    select_parser = subparsers.add_parser("select", help="Queue uncertain, diverse logged queries for labeling")
+    select_parser.add_argument("--log", type=Path, required=True, help="JSONL export of production chat queries")
+    select_parser.add_argument("--budget", type=int, default=DEFAULT_BUDGET, help="Queries to queue for labeling")
+    select_parser.add_argument(
+        "--strategy",
+        choices=["margin", "entropy"],
+        default="margin",
+        help="Uncertainty measure over the calibrated softmax"
+    )
+    select_parser.add_argument("--batch-size", type=int, default=SCORE_BATCH_SIZE, help="Queries scored per batch")
+    add_profile_arguments(select_parser)
+
+    merge_parser = subparsers.add_parser("merge", help="Merge labeled queries into the training set")
+    merge_parser.add_argument("--queue", type=Path, default=LABELING_QUEUE_FILE, help="Labeled queue file")
+
+    args = parser.parse_args()
+    if args.command == "select":
+        if not args.log.exists():
+            print(f"ERROR: Log file not found at {args.log}")
+            sys.exit(1)
+        profiler = RunProfiler("active_learning", enabled=args.profile, torch_trace=args.torch_trace,
+                               trace_allocations=args.trace_allocations)
+        select_queries(args.log, budget=args.budget, strategy=args.strategy, batch_size=args.batch_size,
+                       profiler=profiler)
+        profiler.write()
+    else:
+        merge_labels(args.queue)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Build the BM25 Search Index for YatriAI
+
+Indexes the catalog in mockData.ts (destinations, itineraries, guides) and
+src/data/recommendations.json into a BM25 inverted index with precomputed
+IDF and per-posting weights. The index records a hash of each source file
+and is only rebuilt when a source changes (or with --force).
+
+Usage:
+    python scripts/build_search_index.py
+    python scripts/build_search_index.py --force
+    python scripts/build_search_index.py --query "Ekdalia Evergreen pandal" [--hybrid]
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+from prepare_training_data import MOCK_DATA_FILE, extract_ts_data
+from retrieval import SEARCH_INDEX_FILE, BM25Index, HybridRetriever
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+RECOMMENDATIONS_FILE = Path("src/data/recommendations.json")
+SOURCE_FILES = [MOCK_DATA_FILE, RECOMMENDATIONS_FILE]
+
+
+def source_hashes():
+    """SHA-1 of each source file that exists"""
+    return {
+        str(path): hashlib.sha1(path.read_bytes()).hexdigest()
+        for path in SOURCE_FILES
+        if path.exists()
+    }
+
+
+def collect_documents():
+    """Catalog documents, with text fields mirroring rag.service.ts"""
+    documents = []
+
+    if MOCK_DATA_FILE.exists():
+        destinations, guides, itineraries = extract_ts_data()
+        for d in destinations:
+            documents.append({
+                "title": d["name"],
+                "snippet": d["description"],
+                "type": "destination",
+                "text": f"{d['name']} {d['description']} {d['category']}",
+            })
+        for itinerary in itineraries:
+            documents.append({
+                "title": itinerary["title"],
+                "snippet": ", ".join(itinerary["activities"][:2]),
+                "type": "itinerary",
+                "text": f"{itinerary['title']} {' '.join(itinerary['activities'])}",
+            })
+        for guide in guides:
+            documents.append({
+                "title": guide["name"],
+                "snippet": ", ".join(guide["specialties"][:2]),
+                "type": "guide",
+                "text": f"{guide['name']} {' '.join(guide['specialties'])}",
+            })
+    else:
+        print(f"WARNING: {MOCK_DATA_FILE} not found, skipping catalog")
+
+    if RECOMMENDATIONS_FILE.exists():
+        with open(RECOMMENDATIONS_FILE, "r", encoding='utf-8') as f:
+            recommendations = json.load(f)
+        for rec in recommendations:
+            documents.append({
+                "title": rec["title"],
+                "snippet": rec["description"],
+                "type": "recommendation",
+                "text": f"{rec['title']} {rec['description']} {rec.get('category', '')}",
+            })
+    else:
+        print(f"WARNING: {RECOMMENDATIONS_FILE} not found, skipping recommendations")
+
+    return documents
+
+
+def build_index(force=False):
+    """Build and save the index unless it is already up to date"""
+    hashes = source_hashes()
+    if not force and SEARCH_INDEX_FILE.exists():
+        index = BM25Index.load(SEARCH_INDEX_FILE)
+        if index.sources == hashes:
+            print(f"Index is up to date: {SEARCH_INDEX_FILE} ({len(index.documents)} documents)")
+            return index
+
+    print("Building BM25 index...")
+    start = time.perf_counter()
+    documents = collect_documents()
+    if not documents:
+        print("ERROR: No documents to index")
+        return None
+    index = BM25Index.build(documents, sources=hashes)
+    index.save(SEARCH_INDEX_FILE)
+
+    postings = sum(len(doc_ids) for doc_ids, _ in index.postings.values())
+    print(f"✅ Indexed {len(documents)} documents in {(time.perf_counter() - start) * 1000:.1f}ms")
+    print(f"   Terms: {len(index.postings)}, Postings: {postings}")
+    print(f"   Size: {SEARCH_INDEX_FILE.stat().st_size / 1024:.1f} KB")
+    print(f"   Saved to: {SEARCH_INDEX_FILE}")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the YatriAI BM25 search index")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the sources are unchanged")
+    parser.add_argument("--query", help="Run a search against the index after building it")
+    parser.add_argument("--hybrid", action="store_true", help="With --query, fuse BM25 with dense embedding results")
+    parser.add_argument("--top-k", type=int, default=5, help="Results to print for --query")
+    args = parser.parse_args()
+
+    index = build_index(force=args.force)
+    if index is None or not args.query:
+        return
+
+    if args.hybrid:
+        retriever = HybridRetriever.load(SEARCH_INDEX_FILE)
+        if retriever.dense is None:
+            print("WARNING: Embeddings model not found, showing BM25 results only")
+    else:
+        retriever = HybridRetriever(index)
+
+    start = time.perf_counter()
+    hits = retriever.search(args.query, k=args.top_k)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    print(f"\nResults for '{args.query}' ({elapsed_ms:.2f}ms):")
+    for rank, hit in enumerate(hits, 1):
+        ranks = f"bm25 #{hit['bm25_rank'] or '-'}, dense #{hit['dense_rank'] or '-'}"
+        print(f"{rank}. [{hit['type']}] {hit['title']} ({ranks})")
+        print(f"   {hit['snippet'][:100]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,33 @@ Evaluate Trained Models
 This script evaluates the trained models and computes metrics:
 - Embeddings: Similarity scores, retrieval accuracy
 - Intent Classifier: Accuracy, Precision, Recall, F1-score, Confusion Matrix
+- Intent Calibration: Temperature scaling, ECE, reliability diagram and
+  per-intent LLM-bypass routing thresholds
+- Two-Stage Retrieval: MRR / nDCG / Recall of bi-encoder recall vs
+  cross-encoder reranking on queries held out from reranker training, and
+  the p95 latency the reranker adds
+- Joint Intent + Entity Model: intent accuracy / F1, per-entity-type
+  precision / recall / F1 against the nerService.ts rules, and latency of
+  one joint pass vs the intent classifier plus rule-based entity extraction
 
 Usage:
     python scripts/evaluate_models.py
+    python scripts/evaluate_models.py --target-precision 0.98
+    python scripts/evaluate_models.py --rerank-top-n 20 --rerank-budget-ms 50
+    python scripts/evaluate_models.py --profile [--torch-trace] [--trace-allocations]
 """
 
+import argparse
 import json
 import sys
 from pathlib import Path
 from typing import List, Dict, Tuple
 import numpy as np
 
+from retrieval import RERANK_LATENCY_BUDGET_MS, RERANK_TOP_N, TwoStageRetriever, ranking_metrics
+from run_profiler import RunProfiler, add_profile_arguments
+from token_cache import source_texts, tokenize_cached
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     import io
@@ -23,12 +39,30 @@ if sys.platform == 'win32':
 TRAINING_DATA_DIR = Path("training_data")
 MODELS_DIR = Path("models")
 
+# Intents answered by deterministic handlers in hybridAIService (no Gemini call)
+DETERMINISTIC_INTENTS = [
+    "book_guide",
+    "find_heritage",
+    "budget_question",
+    "booking_query",
+    "marketplace",
+    "transport",
+]
+CALIBRATION_BINS = 10
+ROUTING_TARGET_PRECISION = 0.95
+ROUTING_MIN_THRESHOLD = 0.5  # Never bypass below the chat service's own low-confidence cutoff
+ROUTING_MIN_SUPPORT = 20  # Fewer accepted held-out examples certify nothing: route to the LLM
+ROUTING_CONFIDENCE_Z = 1.645  # One-sided 95% Wilson lower bound on per-intent precision
+RETRIEVAL_K = 10
+LATENCY_REPEATS = 3
+
 
-def evaluate_embeddings_model():
+def evaluate_embeddings_model(profiler=None):
     """Evaluate semantic embeddings model"""
     print("=" * 60)
     print("EVALUATING EMBEDDINGS MODEL")
     print("=" * 60)
+    profiler = profiler or RunProfiler("evaluate_embeddings")
     
     try:
         from sentence_transformers import SentenceTransformer
@@ -45,7 +79,10 @@ def evaluate_embeddings_model():
         return
     
     print(f"Loading model from {model_path}...")
-    model = SentenceTransformer(str(model_path))
+    with profiler.stage("embeddings.load_model"):
+        model = SentenceTransformer(str(model_path))
+    # Newer sentence-transformers tokenize through preprocess()
+    profiler.wrap_method(model, ["preprocess", "tokenize"], "embeddings.tokenize")
     
     # Load test data
     test_file = TRAINING_DATA_DIR / "embedding_pairs.json"
@@ -65,21 +102,22 @@ def evaluate_embeddings_model():
     print(f"  Positive pairs: {len(positive_pairs)}")
     print(f"  Negative pairs: {len(negative_pairs)}")
     
-    # Evaluate positive pairs
-    positive_similarities = []
-    for pair in positive_pairs:
-        query_emb = model.encode(pair["query"])
-        doc_emb = model.encode(pair["document"])
-        similarity = cosine_similarity([query_emb], [doc_emb])[0][0]
-        positive_similarities.append(similarity)
-    
-    # Evaluate negative pairs
-    negative_similarities = []
-    for pair in negative_pairs:
-        query_emb = model.encode(pair["query"])
-        doc_emb = model.encode(pair["document"])
-        similarity = cosine_similarity([query_emb], [doc_emb])[0][0]
-        negative_similarities.append(similarity)
+    with profiler.stage("embeddings.encode"), profiler.torch_profile("embeddings.encode"):
+        # Evaluate positive pairs
+        positive_similarities = []
+        for pair in positive_pairs:
+            query_emb = model.encode(pair["query"])
+            doc_emb = model.encode(pair["document"])
+            similarity = cosine_similarity([query_emb], [doc_emb])[0][0]
+            positive_similarities.append(similarity)
+        
+        # Evaluate negative pairs
+        negative_similarities = []
+        for pair in negative_pairs:
+            query_emb = model.encode(pair["query"])
+            doc_emb = model.encode(pair["document"])
+            similarity = cosine_similarity([query_emb], [doc_emb])[0][0]
+            negative_similarities.append(similarity)
     
     # Calculate metrics
     avg_positive_sim = np.mean(positive_similarities)
@@ -132,11 +170,397 @@ def evaluate_embeddings_model():
     }
 
 
-def evaluate_intent_classifier():
+def evaluate_reranker(top_n=RERANK_TOP_N, latency_budget_ms=RERANK_LATENCY_BUDGET_MS, profiler=None):
+    """Evaluate two-stage retrieval: bi-encoder recall alone vs cross-encoder reranking"""
+    print("\n" + "=" * 60)
+    print("EVALUATING TWO-STAGE RETRIEVAL")
+    print("=" * 60)
+    profiler = profiler or RunProfiler("evaluate_reranker")
+    
+    try:
+        import sentence_transformers  # noqa: F401
+        import transformers  # noqa: F401
+    except ImportError:
+        print("ERROR: Please install required packages:")
+        print("   pip install sentence-transformers transformers torch")
+        return
+    
+    for name in ["heritage-embeddings", "heritage-reranker"]:
+        if not (MODELS_DIR / name).exists():
+            print(f"ERROR: Model not found at {MODELS_DIR / name}")
+            return
+    
+    corpus_file = TRAINING_DATA_DIR / "embedding_pairs.json"
+    # Only queries the reranker was not trained on (split off by train_models.py)
+    test_file = MODELS_DIR / "heritage-reranker" / "heldout_data.json"
+    for path in [corpus_file, test_file]:
+        if not path.exists():
+            print(f"ERROR: Test data not found at {path}")
+            print("   Retrain with: python scripts/train_models.py --model reranker")
+            return
+    with open(corpus_file, "r", encoding='utf-8') as f:
+        corpus = json.load(f)
+    with open(test_file, "r", encoding='utf-8') as f:
+        test_data = json.load(f)
+    
+    # Every distinct document is a candidate; a held-out query's positives are its relevant set
+    documents = sorted(set(p["document"] for p in corpus + test_data))
+    doc_ids = {doc: i for i, doc in enumerate(documents)}
+    relevant = {}
+    for pair in test_data:
+        if pair["label"] >= 0.5:
+            relevant.setdefault(pair["query"], set()).add(doc_ids[pair["document"]])
+    if not relevant:
+        print(f"ERROR: No held-out queries with a relevant document in {test_file}")
+        return
+    print(f"Held-out queries: {len(relevant)}, Documents: {len(documents)}, top-N: {top_n}, budget: {latency_budget_ms}ms")
+    
+    with profiler.stage("reranker.load_models"):
+        retriever = TwoStageRetriever.load(documents, top_n=top_n, latency_budget_ms=latency_budget_ms)
+    retriever.search(next(iter(relevant)), k=RETRIEVAL_K)  # Warm up before timing
+    
+    dense_metrics, reranked_metrics = [], []
+    dense_ms, two_stage_ms, rerank_ms = [], [], []
+    budget_exhausted = 0
+    with profiler.stage("reranker.search"):
+        for query, relevant_ids in relevant.items():
+            hits = retriever.search(query, k=RETRIEVAL_K, rerank=False)
+            dense_metrics.append(ranking_metrics([h["index"] for h in hits], relevant_ids, RETRIEVAL_K))
+            dense_ms.append(retriever.last_timings["recall_ms"])
+            
+            hits = retriever.search(query, k=RETRIEVAL_K)
+            timings = retriever.last_timings
+            reranked_metrics.append(ranking_metrics([h["index"] for h in hits], relevant_ids, RETRIEVAL_K))
+            two_stage_ms.append(timings["recall_ms"] + timings["rerank_ms"])
+            rerank_ms.append(timings["rerank_ms"])
+            budget_exhausted += timings["budget_exhausted"]
+    
+    dense = {name: float(np.mean([m[name] for m in dense_metrics])) for name in dense_metrics[0]}
+    reranked = {name: float(np.mean([m[name] for m in reranked_metrics])) for name in reranked_metrics[0]}
+    latency = {
+        "dense_p50_ms": float(np.percentile(dense_ms, 50)),
+        "dense_p95_ms": float(np.percentile(dense_ms, 95)),
+        "two_stage_p50_ms": float(np.percentile(two_stage_ms, 50)),
+        "two_stage_p95_ms": float(np.percentile(two_stage_ms, 95)),
+        "added_p95_ms": float(np.percentile(rerank_ms, 95)),
+    }
+    
+    print("\n" + "-" * 60)
+    print("TWO-STAGE RETRIEVAL METRICS (held-out queries)")
+    print("-" * 60)
+    print(f"{'Metric':<12} {'Bi-encoder':<12} {'+ Reranker':<12} {'Gain':<10}")
+    for name in dense:
+        print(f"{name:<12} {dense[name]:<12.4f} {reranked[name]:<12.4f} {reranked[name] - dense[name]:+.4f}")
+    print(f"\nLatency per query:")
+    print(f"  Bi-encoder:  p50 {latency['dense_p50_ms']:.2f}ms, p95 {latency['dense_p95_ms']:.2f}ms")
+    print(f"  Two-stage:   p50 {latency['two_stage_p50_ms']:.2f}ms, p95 {latency['two_stage_p95_ms']:.2f}ms")
+    print(f"  Added by reranking (p95): {latency['added_p95_ms']:.2f}ms")
+    print(f"  Budget cut reranking short on {budget_exhausted}/{len(relevant)} queries")
+    
+    return {
+        "top_n": top_n,
+        "latency_budget_ms": latency_budget_ms,
+        "num_queries": len(relevant),
+        "num_documents": len(documents),
+        "bi_encoder": dense,
+        "two_stage": reranked,
+        "gain": {name: reranked[name] - dense[name] for name in dense},
+        "latency": latency,
+        "budget_exhausted_queries": budget_exhausted,
+    }
+
+
+def softmax(logits, temperature=1.0):
+    """Numerically stable softmax over the last axis"""
+    scaled = logits / temperature
+    scaled = scaled - scaled.max(axis=1, keepdims=True)
+    exp = np.exp(scaled)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def predict_logits(model, tokenizer, texts, batch_size=32, profiler=None, cache_texts=None):
+    """Run the classifier over texts in batches and return raw logits
+    
+    With cache_texts (e.g. every text of the data file), inputs come from the
+    token cache built over them instead of being tokenized again.
+    """
+    import torch
+    
+    profiler = profiler or RunProfiler("predict")
+    tokenize = lambda batch: tokenizer(batch, return_tensors="pt", truncation=True, padding=True, max_length=128)  # noqa: E731
+    if cache_texts is not None:
+        with profiler.timed("intent.tokenize"):
+            tokenize = tokenize_cached(cache_texts, tokenizer, max_length=128).lookup
+    batches = []
+    for start in range(0, len(texts), batch_size):
+        with profiler.timed("intent.tokenize"):
+            inputs = tokenize(texts[start:start + batch_size])
+        with profiler.timed("intent.forward"), torch.no_grad():
+            batches.append(model(**inputs).logits.numpy())
+    
+    if not batches:
+        return np.zeros((0, model.config.num_labels))
+    return np.concatenate(batches)
+
+
+def fit_temperature(logits, labels):
+    """Fit a softmax temperature minimizing NLL (golden-section search over log T)"""
+    def nll(log_t):
+        probs = softmax(logits, np.exp(log_t))
+        return -np.mean(np.log(probs[np.arange(len(labels)), labels] + 1e-12))
+    
+    low, high = np.log(0.05), np.log(20.0)
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(60):
+        a = high - ratio * (high - low)
+        b = low + ratio * (high - low)
+        if nll(a) < nll(b):
+            high = b
+        else:
+            low = a
+    
+    return float(np.exp((low + high) / 2))
+
+
+def reliability_bins(confidences, correct, n_bins=CALIBRATION_BINS):
+    """Bucket predictions by confidence and compute ECE"""
+    edges = np.linspace(0.0, 1.0, n_bins + 1)
+    bins = []
+    ece = 0.0
+    for i in range(n_bins):
+        lower, upper = edges[i], edges[i + 1]
+        in_bin = (confidences > lower) & (confidences <= upper) if i > 0 else (confidences <= upper)
+        count = int(in_bin.sum())
+        if count == 0:
+            bins.append({"lower": float(lower), "upper": float(upper), "count": 0, "confidence": None, "accuracy": None})
+            continue
+        avg_conf = float(confidences[in_bin].mean())
+        accuracy = float(correct[in_bin].mean())
+        ece += count / len(confidences) * abs(accuracy - avg_conf)
+        bins.append({"lower": float(lower), "upper": float(upper), "count": count, "confidence": avg_conf, "accuracy": accuracy})
+    
+    return bins, float(ece)
+
+
+def save_reliability_diagram(bins_before, bins_after, output_file):
+    """Plot reliability diagram (skipped if matplotlib is not installed)"""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("   (install matplotlib to save a reliability diagram image)")
+        return False
+    
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.plot([0, 1], [0, 1], linestyle="--", color="gray", label="Perfect calibration")
+    for bins, label in [(bins_before, "Raw logits"), (bins_after, "Temperature scaled")]:
+        points = [(b["confidence"], b["accuracy"]) for b in bins if b["count"] > 0]
+        if points:
+            ax.plot(*zip(*points), marker="o", label=label)
+    ax.set_xlabel("Confidence")
+    ax.set_ylabel("Accuracy")
+    ax.set_title("Intent Classifier Reliability")
+    ax.legend()
+    fig.savefig(output_file, dpi=100, bbox_inches="tight")
+    plt.close(fig)
+    return True
+
+
+def precision_lower_bound(correct, total, z=ROUTING_CONFIDENCE_Z):
+    """One-sided Wilson score lower bound of correct / total"""
+    if total == 0:
+        return 0.0
+    p = correct / total
+    center = p + z * z / (2 * total)
+    margin = z * np.sqrt(p * (1 - p) / total + z * z / (4 * total * total))
+    return float((center - margin) / (1 + z * z / total))
+
+
+def split_calibration_data(items, seed=42):
+    """Stratified halves of the held-out set: (temperature split, threshold split)"""
+    import random
+    
+    rng = random.Random(seed)
+    by_intent = {}
+    for item in items:
+        by_intent.setdefault(item["intent"], []).append(item)
+    temperature_split, threshold_split = [], []
+    for intent in sorted(by_intent):
+        group = list(by_intent[intent])
+        rng.shuffle(group)
+        temperature_split.extend(group[:len(group) // 2])
+        threshold_split.extend(group[len(group) // 2:])
+    return temperature_split, threshold_split
+
+
+def fit_routing_thresholds(confidences, predictions, labels, id_to_intent, target_precision):
+    """Pick the lowest per-intent confidence whose precision lower bound meets target precision
+    
+    Intents without ROUTING_MIN_SUPPORT accepted examples keep threshold None (always use the LLM).
+    """
+    policy = {}
+    for intent_id, intent in sorted(id_to_intent.items()):
+        if intent not in DETERMINISTIC_INTENTS:
+            continue
+        
+        predicted_here = predictions == intent_id
+        conf = confidences[predicted_here]
+        correct = labels[predicted_here] == intent_id
+        
+        entry = {"threshold": None, "support": int((conf >= ROUTING_MIN_THRESHOLD).sum()),
+                 "precision": None, "precision_lower_bound": None}
+        for threshold in np.unique(conf[conf >= ROUTING_MIN_THRESHOLD]):
+            accepted = conf >= threshold
+            if accepted.sum() < ROUTING_MIN_SUPPORT:
+                break
+            lower_bound = precision_lower_bound(int(correct[accepted].sum()), int(accepted.sum()))
+            if lower_bound >= target_precision:
+                entry = {"threshold": float(threshold), "support": int(accepted.sum()),
+                         "precision": float(correct[accepted].mean()), "precision_lower_bound": lower_bound}
+                break
+        policy[intent] = entry
+    
+    return policy
+
+
+def calibrate_intent_classifier(model, tokenizer, model_path, intent_to_id, id_to_intent, fallback_data,
+                                target_precision=ROUTING_TARGET_PRECISION):
+    """Fit temperature scaling and an LLM-bypass routing policy on held-out data
+    
+    The temperature is fit on one half of the held-out set and the thresholds
+    on the other; bypass rate and accuracy are measured on the half the
+    thresholds were not chosen on.
+    """
+    print("\n" + "-" * 60)
+    print("INTENT CLASSIFIER CALIBRATION")
+    print("-" * 60)
+    
+    heldout_file = model_path / "heldout_data.json"
+    heldout_data = []
+    if heldout_file.exists():
+        with open(heldout_file, "r", encoding='utf-8') as f:
+            heldout_data = json.load(f)
+    heldout_data = [item for item in heldout_data if item["intent"] in intent_to_id]
+    
+    if heldout_data:
+        print(f"Calibrating on {len(heldout_data)} held-out examples")
+    else:
+        print("WARNING: No held-out split found, calibrating on the evaluation set.")
+        print("   Retrain with --calibration-holdout for unbiased confidences.")
+        heldout_data = fallback_data
+    
+    temperature_data, threshold_data = split_calibration_data(heldout_data)
+    print(f"   {len(temperature_data)} for the temperature, {len(threshold_data)} for routing thresholds")
+    cache_texts = source_texts(TRAINING_DATA_DIR / "intent_data.json", ["text"],
+                               extra_texts=[item["text"] for item in heldout_data])
+    
+    def split_logits(items):
+        texts = [item["text"] for item in items]
+        labels = np.array([intent_to_id[item["intent"]] for item in items], dtype=int)
+        return predict_logits(model, tokenizer, texts, cache_texts=cache_texts), labels
+    
+    temperature_logits, temperature_labels = split_logits(temperature_data)
+    logits, labels = split_logits(threshold_data)
+    temperature = fit_temperature(temperature_logits, temperature_labels) if len(temperature_labels) else 1.0
+    
+    # Everything below is measured on the threshold split, which the temperature never saw
+    raw_probs = softmax(logits)
+    probs = softmax(logits, temperature)
+    
+    predictions = probs.argmax(axis=1)
+    correct = (predictions == labels).astype(float)
+    bins_before, ece_before = reliability_bins(raw_probs.max(axis=1), correct)
+    bins_after, ece_after = reliability_bins(probs.max(axis=1), correct)
+    
+    print(f"Fitted temperature: {temperature:.4f}")
+    print(f"ECE before scaling: {ece_before:.4f}")
+    print(f"ECE after scaling:  {ece_after:.4f}")
+    
+    print(f"\nReliability Diagram (temperature scaled):")
+    print(f"{'Bin':<14} {'Count':<8} {'Confidence':<12} {'Accuracy':<10}")
+    print("-" * 44)
+    for b in bins_after:
+        if b["count"] == 0:
+            continue
+        bin_name = f"{b['lower']:.1f}-{b['upper']:.1f}"
+        print(f"{bin_name:<14} {b['count']:<8} {b['confidence']:<12.4f} {b['accuracy']:<10.4f}")
+    
+    diagram_file = model_path / "reliability_diagram.png"
+    if save_reliability_diagram(bins_before, bins_after, diagram_file):
+        print(f"Reliability diagram saved to: {diagram_file}")
+    
+    # Routing policy: which intents may skip the LLM, and above which confidence
+    confidences = probs.max(axis=1)
+    thresholds = fit_routing_thresholds(confidences, predictions, labels, id_to_intent, target_precision)
+    
+    # Bypass rate / accuracy on the temperature split: out of sample for the thresholds
+    eval_probs = softmax(temperature_logits, temperature)
+    eval_predictions = eval_probs.argmax(axis=1)
+    eval_confidences = eval_probs.max(axis=1)
+    bypass = np.zeros(len(temperature_labels), dtype=bool)
+    for intent, entry in thresholds.items():
+        if entry["threshold"] is not None:
+            bypass |= (eval_predictions == intent_to_id[intent]) & (eval_confidences >= entry["threshold"])
+    bypass_rate = float(bypass.mean()) if len(bypass) else 0.0
+    bypass_accuracy = float((eval_predictions == temperature_labels)[bypass].mean()) if bypass.any() else None
+    
+    print(f"\nRouting Policy (target precision = {target_precision}, 95% lower bound, "
+          f"min support {ROUTING_MIN_SUPPORT}):")
+    print(f"{'Intent':<20} {'Threshold':<12} {'Support':<10} {'Precision':<10} {'Lower bound':<12}")
+    print("-" * 64)
+    for intent, entry in thresholds.items():
+        threshold = f"{entry['threshold']:.4f}" if entry["threshold"] is not None else "LLM"
+        precision = f"{entry['precision']:.4f}" if entry["precision"] is not None else "-"
+        lower_bound = f"{entry['precision_lower_bound']:.4f}" if entry["precision_lower_bound"] is not None else "-"
+        print(f"{intent[:18]:<20} {threshold:<12} {entry['support']:<10} {precision:<10} {lower_bound:<12}")
+    if all(entry["threshold"] is None for entry in thresholds.values()):
+        print("No intent has enough held-out support to bypass the LLM; every query is routed to it")
+    print(f"\nExpected LLM bypass rate: {bypass_rate:.4f} ({bypass_rate*100:.2f}%)")
+    if bypass_accuracy is not None:
+        print(f"Accuracy on bypassed queries: {bypass_accuracy:.4f} ({bypass_accuracy*100:.2f}%)")
+    
+    calibration = {
+        "temperature": temperature,
+        "ece_before": ece_before,
+        "ece_after": ece_after,
+        "temperature_examples": len(temperature_labels),
+        "threshold_examples": len(labels),
+        "reliability_bins": bins_after,
+    }
+    policy = {
+        "temperature": temperature,
+        "target_precision": target_precision,
+        "min_support": ROUTING_MIN_SUPPORT,
+        "precision_confidence_z": ROUTING_CONFIDENCE_Z,
+        "deterministic_intents": DETERMINISTIC_INTENTS,
+        "thresholds": {intent: entry["threshold"] for intent, entry in thresholds.items()},
+        "per_intent": thresholds,
+        "expected_bypass_rate": bypass_rate,
+        "bypass_accuracy": bypass_accuracy,
+    }
+    
+    with open(model_path / "calibration.json", "w", encoding='utf-8') as f:
+        json.dump(calibration, f, indent=2)
+    with open(model_path / "routing_policy.json", "w", encoding='utf-8') as f:
+        json.dump(policy, f, indent=2)
+    print(f"Routing policy saved to: {model_path / 'routing_policy.json'}")
+    
+    return {
+        "temperature": temperature,
+        "ece_before": ece_before,
+        "ece_after": ece_after,
+        "expected_bypass_rate": bypass_rate,
+        "bypass_accuracy": bypass_accuracy,
+    }
+
+
+def evaluate_intent_classifier(target_precision=ROUTING_TARGET_PRECISION, profiler=None):
     """Evaluate intent classification model"""
     print("\n" + "=" * 60)
     print("EVALUATING INTENT CLASSIFIER")
     print("=" * 60)
+    profiler = profiler or RunProfiler("evaluate_intent")
     
     try:
         import torch
@@ -154,8 +578,9 @@ def evaluate_intent_classifier():
         return
     
     print(f"Loading model from {model_path}...")
-    tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-    model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
+    with profiler.stage("intent.load_model"):
+        tokenizer = AutoTokenizer.from_pretrained(str(model_path))
+        model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
     
     # Load intent mapping
     mapping_file = model_path / "intent_mapping.json"
@@ -186,13 +611,9 @@ def evaluate_intent_classifier():
     
     # Predict
     print("Running predictions...")
-    predictions = []
-    for text in texts:
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=128)
-        with torch.no_grad():
-            outputs = model(**inputs)
-        predicted_id = outputs.logits.argmax().item()
-        predictions.append(predicted_id)
+    with profiler.stage("intent.predict"), profiler.torch_profile("intent.predict"):
+        cache_texts = source_texts(test_file, ["text"])
+        predictions = predict_logits(model, tokenizer, texts, profiler=profiler, cache_texts=cache_texts).argmax(axis=1).tolist()
     
     # Calculate metrics
     accuracy = accuracy_score(true_labels, predictions)
@@ -268,17 +689,196 @@ def evaluate_intent_classifier():
     else:
         print("  No errors found! Perfect classification!")
     
+    with profiler.stage("intent.calibrate"):
+        calibration = calibrate_intent_classifier(
+            model, tokenizer, model_path, intent_to_id, id_to_intent, test_data, target_precision
+        )
+    
     return {
         "accuracy": float(accuracy),
         "precision": float(precision),
         "recall": float(recall),
         "f1_score": float(f1),
         "num_errors": len(errors),
-        "total_examples": len(test_data)
+        "total_examples": len(test_data),
+        "calibration": calibration
+    }
+
+
+def timed_per_query(fn, texts, repeats=LATENCY_REPEATS):
+    """Per-call latencies (ms) of fn([text]) over texts, repeated"""
+    import time
+    
+    fn(texts[:1])  # Warm up before timing
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            fn([text])
+            latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def evaluate_joint_model(profiler=None):
+    """Evaluate the joint model's two heads and its latency against the current intent + rules pipeline"""
+    print("\n" + "=" * 60)
+    print("EVALUATING JOINT INTENT + ENTITY MODEL")
+    print("=" * 60)
+    profiler = profiler or RunProfiler("evaluate_joint")
+    
+    try:
+        import torch  # noqa: F401
+        import transformers  # noqa: F401
+        from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+    except ImportError:
+        print("ERROR: Please install required packages:")
+        print("   pip install transformers scikit-learn torch")
+        return
+    from joint_model import ENTITY_FIELDS, JOINT_MODEL_DIR, JointPredictor, entities_by_field, silver_entity_spans
+    from model_registry import IntentPredictor
+    
+    if not JOINT_MODEL_DIR.exists():
+        print(f"ERROR: Model not found at {JOINT_MODEL_DIR}")
+        return
+    
+    # Held-out examples when the model was trained with a holdout, else the training data
+    test_data = []
+    test_file = JOINT_MODEL_DIR / "heldout_data.json"
+    if test_file.exists():
+        with open(test_file, "r", encoding='utf-8') as f:
+            test_data = json.load(f)
+    if not test_data:
+        test_file = TRAINING_DATA_DIR / "intent_data.json"
+        print("WARNING: No held-out split found, evaluating on the training data")
+        with open(test_file, "r", encoding='utf-8') as f:
+            test_data = json.load(f)
+    texts = [item["text"] for item in test_data]
+    print(f"Loaded {len(test_data)} test examples from {test_file}")
+    
+    with profiler.stage("joint.load_model"):
+        predictor = JointPredictor(JOINT_MODEL_DIR)
+    
+    with profiler.stage("joint.predict"):
+        predictions = []
+        for start in range(0, len(texts), 32):
+            predictions.extend(predictor.predict(texts[start:start + 32]))
+    
+    # Intent head (examples that have an intent label)
+    labeled = [(item["intent"], pred["intent"]) for item, pred in zip(test_data, predictions) if item.get("intent")]
+    true_intents = [t for t, _ in labeled]
+    predicted_intents = [p for _, p in labeled]
+    accuracy = accuracy_score(true_intents, predicted_intents)
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        true_intents, predicted_intents, average='weighted', zero_division=0
+    )
+    
+    # Entity head: exact (type, text) matches against the silver rules, per type
+    counts = {entity: {"tp": 0, "fp": 0, "fn": 0} for entity in ENTITY_FIELDS}
+    for text, pred in zip(texts, predictions):
+        expected = {(entity, text[start:end].lower()) for start, end, entity in silver_entity_spans(text)}
+        found = {
+            (entity, value.lower())
+            for entity, field in ENTITY_FIELDS.items()
+            for value in pred["entities"][field]
+        }
+        for entity in ENTITY_FIELDS:
+            exp = {e for e in expected if e[0] == entity}
+            got = {e for e in found if e[0] == entity}
+            counts[entity]["tp"] += len(exp & got)
+            counts[entity]["fp"] += len(got - exp)
+            counts[entity]["fn"] += len(exp - got)
+    
+    def prf(c):
+        p = c["tp"] / (c["tp"] + c["fp"]) if c["tp"] + c["fp"] else 0.0
+        r = c["tp"] / (c["tp"] + c["fn"]) if c["tp"] + c["fn"] else 0.0
+        return {"precision": p, "recall": r, "f1": 2 * p * r / (p + r) if p + r else 0.0, "support": c["tp"] + c["fn"]}
+    
+    entity_metrics = {entity: prf(c) for entity, c in counts.items()}
+    total = {key: sum(c[key] for c in counts.values()) for key in ("tp", "fp", "fn")}
+    entity_metrics["micro"] = prf(total)
+    
+    # Latency: one joint pass vs the current pipeline it replaces, the trained
+    # intent classifier followed by the rule-based extraction of nerService.ts
+    with profiler.stage("joint.latency"):
+        joint_ms = timed_per_query(predictor.predict, texts)
+        latency = {
+            "joint_p50_ms": float(np.percentile(joint_ms, 50)),
+            "joint_p95_ms": float(np.percentile(joint_ms, 95)),
+            "separate_p50_ms": None,
+            "separate_p95_ms": None,
+            "speedup_p50": None,
+        }
+        intent_dir = MODELS_DIR / "intent-classifier"
+        if intent_dir.exists():
+            intent_predictor = IntentPredictor(intent_dir)
+            
+            def current_pipeline(batch):
+                intent_predictor.predict(batch)
+                for text in batch:
+                    entities_by_field((entity, text[start:end]) for start, end, entity in silver_entity_spans(text))
+            
+            separate_ms = timed_per_query(current_pipeline, texts)
+            latency["separate_p50_ms"] = float(np.percentile(separate_ms, 50))
+            latency["separate_p95_ms"] = float(np.percentile(separate_ms, 95))
+            latency["speedup_p50"] = latency["separate_p50_ms"] / latency["joint_p50_ms"]
+        else:
+            print(f"WARNING: No intent classifier at {intent_dir}, skipping the current-pipeline latency baseline")
+    
+    print("\n" + "-" * 60)
+    print("JOINT MODEL METRICS")
+    print("-" * 60)
+    print(f"Intent head ({len(labeled)} examples):")
+    print(f"  Accuracy: {accuracy:.4f}, Weighted F1: {f1:.4f}")
+    print(f"\nEntity head (vs nerService.ts rules):")
+    print(f"{'Type':<15} {'Precision':<12} {'Recall':<12} {'F1-Score':<12} {'Support':<10}")
+    print("-" * 60)
+    for entity, m in entity_metrics.items():
+        print(f"{entity:<15} {m['precision']:<12.4f} {m['recall']:<12.4f} {m['f1']:<12.4f} {m['support']:<10}")
+    print(f"\nLatency per query:")
+    print(f"  Joint (1 pass):                     p50 {latency['joint_p50_ms']:.2f}ms, p95 {latency['joint_p95_ms']:.2f}ms")
+    if latency["speedup_p50"] is not None:
+        print(f"  Intent classifier + rule extraction: p50 {latency['separate_p50_ms']:.2f}ms, p95 {latency['separate_p95_ms']:.2f}ms")
+        print(f"  Speedup (p50): {latency['speedup_p50']:.2f}x")
+    
+    return {
+        "total_examples": len(test_data),
+        "intent": {
+            "accuracy": float(accuracy),
+            "precision": float(precision),
+            "recall": float(recall),
+            "f1_score": float(f1),
+            "examples": len(labeled),
+        },
+        "entities": entity_metrics,
+        "latency": latency,
     }
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Evaluate YatriAI custom models")
+    parser.add_argument(
+        "--target-precision",
+        type=float,
+        default=ROUTING_TARGET_PRECISION,
+        help="Precision a deterministic intent must reach before it may skip the LLM"
+    )
+    parser.add_argument(
+        "--rerank-top-n",
+        type=int,
+        default=RERANK_TOP_N,
+        help="Bi-encoder candidates passed to the cross-encoder reranker"
+    )
+    parser.add_argument(
+        "--rerank-budget-ms",
+        type=float,
+        default=RERANK_LATENCY_BUDGET_MS,
+        help="Per-query latency budget for reranking"
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = RunProfiler("evaluate_models", enabled=args.profile, torch_trace=args.torch_trace,
+                           trace_allocations=args.trace_allocations)
+    
     print("\n" + "=" * 60)
     print("YATRIAI MODEL EVALUATION")
     print("=" * 60)
@@ -295,26 +895,43 @@ def main():
     
     # Evaluate embeddings
     try:
-        results["embeddings"] = evaluate_embeddings_model()
+        results["embeddings"] = evaluate_embeddings_model(profiler=profiler)
     except Exception as e:
         print(f"ERROR evaluating embeddings: {e}")
         import traceback
         traceback.print_exc()
     
+    # Evaluate two-stage retrieval
+    try:
+        results["reranker"] = evaluate_reranker(args.rerank_top_n, args.rerank_budget_ms, profiler=profiler)
+    except Exception as e:
+        print(f"ERROR evaluating reranker: {e}")
+        import traceback
+        traceback.print_exc()
+    
     # Evaluate intent classifier
     try:
-        results["intent"] = evaluate_intent_classifier()
+        results["intent"] = evaluate_intent_classifier(target_precision=args.target_precision, profiler=profiler)
     except Exception as e:
         print(f"ERROR evaluating intent classifier: {e}")
         import traceback
         traceback.print_exc()
     
+    # Evaluate joint intent + entity model
+    if (MODELS_DIR / "joint-intent-ner").exists():
+        try:
+            results["joint"] = evaluate_joint_model(profiler=profiler)
+        except Exception as e:
+            print(f"ERROR evaluating joint model: {e}")
+            import traceback
+            traceback.print_exc()
+    
     # Summary
     print("\n" + "=" * 60)
     print("EVALUATION SUMMARY")
     print("=" * 60)
     
-    if "embeddings" in results:
+    if results.get("embeddings"):
         emb = results["embeddings"]
         print(f"\nEmbeddings Model:")
         print(f"  Accuracy:  {emb['accuracy']:.4f} ({emb['accuracy']*100:.2f}%)")
@@ -322,7 +939,14 @@ def main():
         print(f"  Recall:    {emb['recall']:.4f} ({emb['recall']*100:.2f}%)")
         print(f"  F1-Score:  {emb['f1_score']:.4f} ({emb['f1_score']*100:.2f}%)")
     
-    if "intent" in results:
+    if results.get("reranker"):
+        reranker = results["reranker"]
+        print(f"\nTwo-Stage Retrieval (top-{reranker['top_n']} reranked, {reranker['num_queries']} held-out queries):")
+        print(f"  MRR:       {reranker['bi_encoder']['mrr']:.4f} -> {reranker['two_stage']['mrr']:.4f}")
+        print(f"  nDCG@{RETRIEVAL_K}:   {reranker['bi_encoder'][f'ndcg@{RETRIEVAL_K}']:.4f} -> {reranker['two_stage'][f'ndcg@{RETRIEVAL_K}']:.4f}")
+        print(f"  Added p95: {reranker['latency']['added_p95_ms']:.2f}ms")
+    
+    if results.get("intent"):
         intent = results["intent"]
         print(f"\nIntent Classifier:")
         print(f"  Accuracy:  {intent['accuracy']:.4f} ({intent['accuracy']*100:.2f}%)")
@@ -330,6 +954,21 @@ def main():
         print(f"  Recall:    {intent['recall']:.4f} ({intent['recall']*100:.2f}%)")
         print(f"  F1-Score:  {intent['f1_score']:.4f} ({intent['f1_score']*100:.2f}%)")
         print(f"  Errors:    {intent['num_errors']}/{intent['total_examples']}")
+        calibration = intent.get("calibration")
+        if calibration:
+            print(f"  ECE:       {calibration['ece_before']:.4f} -> {calibration['ece_after']:.4f} (T = {calibration['temperature']:.3f})")
+            print(f"  LLM bypass rate: {calibration['expected_bypass_rate']*100:.2f}%")
+    
+    if results.get("joint"):
+        joint = results["joint"]
+        print(f"\nJoint Intent + Entity Model:")
+        print(f"  Intent accuracy: {joint['intent']['accuracy']:.4f}")
+        print(f"  Entity F1:       {joint['entities']['micro']['f1']:.4f}")
+        if joint['latency']['speedup_p50'] is not None:
+            print(f"  p50 latency:     {joint['latency']['joint_p50_ms']:.2f}ms vs {joint['latency']['separate_p50_ms']:.2f}ms "
+                  f"for intent classifier + rules ({joint['latency']['speedup_p50']:.2f}x)")
+        else:
+            print(f"  p50 latency:     {joint['latency']['joint_p50_ms']:.2f}ms")
     
     # Save results
     results_file = Path("evaluation_results.json")
@@ -337,6 +976,7 @@ def main():
         json.dump(results, f, indent=2, ensure_ascii=False)
     
     print(f"\nResults saved to: {results_file}")
+    profiler.write()
     print("\n" + "=" * 60)
 
 
@@ -0,0 +1,334 @@
+"""
+Hyperparameter Search for YatriAI Models
+
+Runs training trials for the embeddings model or intent classifier across
+worker processes. Trials train through the same code as train_models.py
+(the HF Trainer for the intent classifier, SentenceTransformerTrainer for
+embeddings), so the chosen config is tuned on the setup it is used in.
+A trial is pruned when its validation score after an epoch falls below the
+median of the other trials at the same epoch. The report
+lists the Pareto front of validation score vs training time vs model latency,
+and the chosen config is written to models/<name>/manifest.json, where
+train_models.py picks it up for the next training run.
+
+Validation scores:
+- Intent classifier: accuracy on a stratified validation split
+- Embeddings: separation (mean positive - mean negative cosine similarity)
+
+Usage:
+    python scripts/train_models.py --model intent --search --trials 16 --workers 4
+    python scripts/train_models.py --model embeddings --search --trials 8
+"""
+
+import json
+import math
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+
+from run_profiler import PROFILES_DIR
+from train_models import (
+    build_embeddings_trainer,
+    build_intent_trainer,
+    cache_embedding_tokenization,
+    load_training_config,
+    prepare_embedding_data,
+    prepare_intent_data,
+    update_manifest,
+)
+
+SEARCH_SPACE = {
+    "learning_rate": ("log_uniform", 1e-5, 1e-4),
+    "epochs": ("choice", [2, 3, 4, 5, 6, 8]),
+    "batch_size": ("choice", [8, 16, 32]),
+    "warmup_steps": ("choice", [0, 10, 50]),
+    "weight_decay": ("choice", [0.0, 0.01, 0.1]),
+}
+VALIDATION_FRACTION = 0.2
+PRUNE_STARTUP_TRIALS = 3  # Never prune before this many trials reported an epoch
+PRUNE_WARMUP_EPOCHS = 1  # Never prune on the first epoch
+LATENCY_QUERIES = 50
+
+BASE_MODELS = {
+    "heritage-embeddings": "sentence-transformers/all-MiniLM-L6-v2",
+    "intent-classifier": "distilbert-base-uncased",
+}
+
+
+def sample_config(rng):
+    """Draw one configuration from SEARCH_SPACE"""
+    config = {}
+    for name, (kind, *values) in SEARCH_SPACE.items():
+        if kind == "log_uniform":
+            low, high = values
+            config[name] = float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        else:
+            config[name] = rng.choice(values[0])
+    return config
+
+
+def stratified_split(examples, key, fraction, seed=42):
+    """Split examples into (train, validation), stratified by examples[key]"""
+    rng = random.Random(seed)
+    groups = {}
+    for example in examples:
+        groups.setdefault(str(example[key]), []).append(example)
+
+    train, validation = [], []
+    for _, items in sorted(groups.items()):
+        items = list(items)
+        rng.shuffle(items)
+        n_val = max(1, round(len(items) * fraction)) if len(items) > 1 else 0
+        validation.extend(items[:n_val])
+        train.extend(items[n_val:])
+    return train, validation
+
+
+def report_and_check_prune(intermediate, lock, epoch, score):
+    """Record a trial's score for an epoch; prune if below the median of other trials"""
+    with lock:
+        others = list(intermediate.get(epoch, []))
+        intermediate[epoch] = others + [score]
+
+    if epoch < PRUNE_WARMUP_EPOCHS or len(others) < PRUNE_STARTUP_TRIALS:
+        return False
+    return score < statistics.median(others)
+
+
+def _median_latency_ms(predict_one, texts):
+    """Median single-query inference latency in milliseconds"""
+    timings = []
+    for text in texts[:LATENCY_QUERIES]:
+        start = time.perf_counter()
+        predict_one(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings) if timings else None
+
+
+def _intent_trial(config, train, validation, check_prune):
+    """Train the intent classifier with the real Trainer setup; returns (history, pruned, latency_ms)"""
+    import tempfile
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, TrainerCallback
+
+    intents = sorted(set(item["intent"] for item in train + validation))
+    intent_to_id = {intent: idx for idx, intent in enumerate(intents)}
+    base_model = BASE_MODELS["intent-classifier"]
+    tokenizer = AutoTokenizer.from_pretrained(base_model)
+    model = AutoModelForSequenceClassification.from_pretrained(base_model, num_labels=len(intents))
+
+    labels = torch.tensor([intent_to_id[item["intent"]] for item in validation])
+    history = []
+
+    class ValidationCallback(TrainerCallback):
+        """Score the validation split after each epoch and stop the Trainer when pruned"""
+
+        pruned = False
+
+        def on_epoch_end(self, args, state, control, model=None, **kwargs):
+            model.eval()
+            correct = 0
+            with torch.no_grad():
+                for start in range(0, len(validation), 64):
+                    inputs = tokenizer([item["text"] for item in validation[start:start + 64]],
+                                       return_tensors="pt", truncation=True, padding=True, max_length=128)
+                    correct += (model(**inputs).logits.argmax(dim=1) == labels[start:start + 64]).sum().item()
+            model.train()
+            score = correct / len(validation)
+            history.append(score)
+            if check_prune(len(history) - 1, score):
+                self.pruned = control.should_training_stop = True
+            return control
+
+    callback = ValidationCallback()
+    with tempfile.TemporaryDirectory() as output_dir:
+        trainer = build_intent_trainer(
+            model, tokenizer, train, intent_to_id, config, output_dir,
+            save_strategy="no", callbacks=[callback],
+        )
+        trainer.train()
+    if callback.pruned:
+        return history, True, None
+
+    model.eval()
+
+    def predict_one(text):
+        with torch.no_grad():
+            model(**tokenizer(text, return_tensors="pt", truncation=True, max_length=128))
+
+    return history, False, _median_latency_ms(predict_one, [item["text"] for item in validation])
+
+
+def _embeddings_trial(config, train, validation, check_prune):
+    """Train the embeddings model with the real Trainer setup; returns (history, pruned, latency_ms)"""
+    import tempfile
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from transformers import TrainerCallback
+
+    model = SentenceTransformer(BASE_MODELS["heritage-embeddings"])
+    cache_embedding_tokenization(model, train + validation)
+
+    positives = [pair for pair in validation if pair["label"] >= 0.5]
+    negatives = [pair for pair in validation if pair["label"] < 0.5]
+
+    def mean_similarity(pairs):
+        if not pairs:
+            return 0.0
+        queries = model.encode([p["query"] for p in pairs], convert_to_tensor=True)
+        documents = model.encode([p["document"] for p in pairs], convert_to_tensor=True)
+        return torch.cosine_similarity(queries, documents).mean().item()
+
+    history = []
+
+    class ValidationCallback(TrainerCallback):
+        """Score validation separation after each epoch and stop the Trainer when pruned"""
+
+        pruned = False
+
+        def on_epoch_end(self, args, state, control, **kwargs):
+            score = mean_similarity(positives) - mean_similarity(negatives)
+            model.train()  # encode() leaves the model in eval mode
+            history.append(score)
+            if check_prune(len(history) - 1, score):
+                self.pruned = control.should_training_stop = True
+            return control
+
+    callback = ValidationCallback()
+    with tempfile.TemporaryDirectory() as output_dir:
+        trainer = build_embeddings_trainer(model, train, config, output_dir, save_strategy="no", callbacks=[callback])
+        trainer.train()
+    if callback.pruned:
+        return history, True, None
+
+    return history, False, _median_latency_ms(model.encode, [p["query"] for p in validation])
+
+
+def run_trial(name, trial_id, config, train, validation, intermediate, lock, threads):
+    """Run one trial (in a worker process) and return its result record"""
+    import torch
+
+    torch.set_num_threads(threads)
+    torch.manual_seed(trial_id)
+
+    def check_prune(epoch, score):
+        return report_and_check_prune(intermediate, lock, epoch, score)
+
+    trial_fn = _intent_trial if name == "intent-classifier" else _embeddings_trial
+    start = time.perf_counter()
+    history, pruned, latency_ms = trial_fn(config, train, validation, check_prune)
+    return {
+        "trial": trial_id,
+        "config": config,
+        "status": "pruned" if pruned else "complete",
+        "epochs_run": len(history),
+        "val_score": history[-1] if history else None,
+        "history": history,
+        "train_time_s": time.perf_counter() - start,
+        "latency_ms": latency_ms,
+    }
+
+
+def pareto_front(results):
+    """Completed trials not dominated on (max score, min train time, min latency)"""
+    # A trial without a latency measurement cannot be compared on it
+    complete = [r for r in results if r["status"] == "complete" and r["latency_ms"] is not None]
+
+    def dominates(a, b):
+        no_worse = (a["val_score"] >= b["val_score"] and a["train_time_s"] <= b["train_time_s"]
+                    and a["latency_ms"] <= b["latency_ms"])
+        better = (a["val_score"] > b["val_score"] or a["train_time_s"] < b["train_time_s"]
+                  or a["latency_ms"] < b["latency_ms"])
+        return no_worse and better
+
+    return [r for r in complete if not any(dominates(other, r) for other in complete)]
+
+
+def run_search(name, trials=12, workers=1, seed=42):
+    """Search hyperparameters for `name` and record the chosen config in its manifest"""
+    print("=" * 60)
+    print(f"HYPERPARAMETER SEARCH: {name}")
+    print("=" * 60)
+
+    if name == "intent-classifier":
+        train, validation = stratified_split(prepare_intent_data(), "intent", VALIDATION_FRACTION, seed)
+    else:
+        train, validation = stratified_split(prepare_embedding_data(), "label", VALIDATION_FRACTION, seed)
+    print(f"Train: {len(train)}, Validation: {len(validation)}, Trials: {trials}, Workers: {workers}")
+    if not validation:
+        print("ERROR: Validation split is empty (every label has a single example); add more training data")
+        return None
+
+    rng = random.Random(seed)
+    # Trial 0 is the config currently in the manifest, as a baseline
+    configs = [load_training_config(name)] + [sample_config(rng) for _ in range(trials - 1)]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    if workers <= 1:
+        intermediate, lock = {}, threading.Lock()
+        results = [
+            run_trial(name, i, config, train, validation, intermediate, lock, threads)
+            for i, config in enumerate(configs)
+        ]
+    else:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager, ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            intermediate, lock = manager.dict(), manager.Lock()
+            futures = [
+                pool.submit(run_trial, name, i, config, train, validation, intermediate, lock, threads)
+                for i, config in enumerate(configs)
+            ]
+            results = [future.result() for future in futures]
+
+    front = pareto_front(results)
+    if not front:
+        print("ERROR: No trial completed")
+        return None
+    chosen = max(front, key=lambda r: (r["val_score"], -r["train_time_s"]))
+
+    print(f"\n{'Trial':<7} {'Status':<10} {'Epochs':<8} {'Score':<9} {'Time (s)':<10} {'Latency (ms)':<13} {'LR':<10} {'Batch':<6}")
+    print("-" * 78)
+    for r in results:
+        latency = f"{r['latency_ms']:.2f}" if r["latency_ms"] is not None else "-"
+        marker = " *" if r in front else ""
+        print(f"{r['trial']:<7} {r['status']:<10} {r['epochs_run']:<8} {r['val_score']:<9.4f} "
+              f"{r['train_time_s']:<10.1f} {latency:<13} {r['config']['learning_rate']:<10.2e} "
+              f"{r['config']['batch_size']:<6}{marker}")
+    pruned = sum(1 for r in results if r["status"] == "pruned")
+    print(f"\n* = Pareto front (score vs training time vs latency); {pruned} trial(s) pruned early")
+    print(f"Chosen: trial {chosen['trial']} -> {chosen['config']}")
+
+    PROFILES_DIR.mkdir(exist_ok=True)
+    report_file = PROFILES_DIR / f"hparam-search-{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(report_file, "w", encoding='utf-8') as f:
+        json.dump({
+            "model": name,
+            "search_space": SEARCH_SPACE,
+            "results": results,
+            "pareto_front": [r["trial"] for r in front],
+            "chosen_trial": chosen["trial"],
+        }, f, indent=2)
+
+    update_manifest(
+        name,
+        training_config=chosen["config"],
+        hyperparameter_search={
+            "report": str(report_file),
+            "chosen_trial": chosen["trial"],
+            "val_score": chosen["val_score"],
+            "train_time_s": chosen["train_time_s"],
+            "latency_ms": chosen["latency_ms"],
+            "searched_at": datetime.now().isoformat(timespec="seconds"),
+        },
+    )
+    print(f"Search report saved to: {report_file}")
+    print(f"Chosen config written to: models/{name}/manifest.json")
+    return chosen
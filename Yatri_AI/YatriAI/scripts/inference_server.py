@@ -0,0 +1,530 @@
+"""
+Local Inference Server for YatriAI Models
+
+Serves the registry's current intent classifier, embeddings model, joint
+intent + entity model and monument photo index over HTTP with the same
+request shape as the backend's /api/ml/* routes.
+Concurrent requests are grouped into micro-batches: a batch runs when it
+reaches --max-batch requests or when its oldest request has waited
+--max-wait-ms. Each response reports the batch size it ran in. Models
+hot-swap when the registry's CURRENT pointer moves (see model_registry.py).
+
+With --workers N the server pre-forks: the parent loads the models once,
+freezes the GC so collections do not dirty the shared object pages, and
+forks N workers that share the weights copy-on-write and accept on one
+shared listening socket. When the registry pointer moves, the parent loads
+the new version, forks a new generation of workers and drains the old one.
+Per-worker RSS / PSS and request counts are printed periodically.
+
+Routes:
+    POST /api/ml/intent       {"query": "..."} -> {"intent", "confidence", ...}
+    POST /api/ml/embeddings   {"query": "..."} -> {"embedding": [...], ...}
+    POST /api/ml/analyze      {"query": "..."} -> {"intent", "confidence", "entities", ...}
+    POST /api/ml/monument     {"imageBase64": "..."} -> {"site", "score", "recognized", ...}
+    GET  /api/health
+
+Usage:
+    python scripts/inference_server.py --port 8000
+    python scripts/inference_server.py --port 8000 --max-batch 32 --max-wait-ms 5
+    python scripts/inference_server.py --port 8000 --workers 4
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from model_registry import (
+    MODELS_DIR,
+    POLL_INTERVAL_S,
+    HotSwapModel,
+    current_version,
+    load_predictor,
+    version_path,
+    warm_up,
+)
+from monument_index import image_bytes
+from run_profiler import current_rss_mb, smaps_memory_mb
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+DEFAULT_PORT = 8000
+MAX_BATCH_SIZE = 32
+MAX_BATCH_WAIT_MS = 5.0
+MAX_BODY_BYTES = 16 << 20  # Base64 of the backend's 10MB image upload limit
+DRAIN_TIMEOUT_S = 30.0  # Longest an old worker waits for in-flight requests
+LISTEN_BACKLOG = 2048
+MEMORY_REPORT_INTERVAL_S = 30.0
+
+# Route -> registry model name
+ROUTES = {
+    "/api/ml/intent": "intent-classifier",
+    "/api/ml/embeddings": "heritage-embeddings",
+    "/api/ml/analyze": "joint-intent-ner",
+    "/api/ml/monument": "monument-index",
+}
+
+# Request body field holding each model's input (default "query")
+INPUT_FIELDS = {"monument-index": "imageBase64"}
+# Parse a field before batching; ValueError -> 400 (images are decoded from base64 only)
+INPUT_PARSERS = {"monument-index": image_bytes}
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def read_http_request(reader):
+    """Read one HTTP/1.1 request; returns (method, path, headers, body) or None at EOF"""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target.split("?", 1)[0], headers, body
+
+
+async def write_json_response(writer, status, payload, keep_alive=True):
+    """Write a JSON HTTP/1.1 response"""
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+class MicroBatcher:
+    """Groups concurrent requests for one model into batched predict() calls"""
+
+    def __init__(self, model, max_batch=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        # One inference thread per model; torch parallelizes inside the batch
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, text):
+        """Queue one input; returns (prediction, model version, batch size)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def run(self):
+        """Collect and run batches until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait_s
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # The whole batch runs on one model version, even if a swap lands meanwhile
+            version, predictor = self.model.current()
+            texts = [text for text, _ in batch]
+            try:
+                predictions = await loop.run_in_executor(self.executor, predictor.predict, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result((prediction, version, len(batch)))
+
+
+class StaticModel:
+    """A model that never swaps (pre-fork workers are replaced instead)"""
+
+    def __init__(self, version, predictor):
+        self.version = version
+        self.predictor = predictor
+
+    def current(self):
+        return self.version, self.predictor
+
+
+class InferenceApp:
+    """HTTP front end over one MicroBatcher per loaded model"""
+
+    def __init__(self, models, max_batch=MAX_BATCH_SIZE, max_wait_ms=MAX_BATCH_WAIT_MS,
+                 request_counts=None, slot=0):
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.batchers = {}
+        self.active_requests = 0
+        # Shared per-worker counters, so the pre-fork parent can report balance
+        self.request_counts = request_counts
+        self.slot = slot
+
+    @classmethod
+    def from_registry(cls, model_names, **kwargs):
+        """Single-process app whose models hot-swap in place"""
+        models = {}
+        for name in model_names:
+            model = HotSwapModel(name, fallback_dir=MODELS_DIR / name).start()
+            if model.current()[1] is None:
+                print(f"WARNING: {name} is not published or trained, its route will return 503")
+                continue
+            print(f"Loaded {name} {model.current()[0]}")
+            models[name] = model
+        return cls(models, **kwargs)
+
+    def start_batchers(self):
+        """Create the batchers on the running event loop"""
+        for name, model in self.models.items():
+            self.batchers[name] = MicroBatcher(model, self.max_batch, self.max_wait_ms)
+            asyncio.get_running_loop().create_task(self.batchers[name].run())
+
+    async def handle(self, method, path, body):
+        """Dispatch one request; returns (status, payload)"""
+        if method == "GET" and path == "/api/health":
+            return 200, {
+                "status": "ok",
+                "pid": os.getpid(),
+                "models": {name: m.current()[0] for name, m in self.models.items()},
+                "memory": smaps_memory_mb(),
+            }
+        if method != "POST" or path not in ROUTES:
+            return 404, {"error": f"No route for {method} {path}"}
+        name = ROUTES[path]
+        if name not in self.batchers:
+            return 503, {"error": f"Model {name} is not loaded"}
+
+        field = INPUT_FIELDS.get(name, "query")
+        try:
+            query = json.loads(body or b"{}").get(field)
+        except (json.JSONDecodeError, AttributeError):
+            query = None
+        if not query or not isinstance(query, str):
+            return 400, {"error": f"{field} is required"}
+        model_input = query
+        if name in INPUT_PARSERS:
+            try:
+                model_input = INPUT_PARSERS[name](query)
+            except ValueError as e:
+                return 400, {"error": f"Invalid {field}: {e}"}
+
+        prediction, version, batch_size = await self.batchers[name].submit(model_input)
+        if name == "heritage-embeddings":
+            payload = {"embedding": [round(float(x), 6) for x in prediction], "query": query}
+        elif name == "monument-index":
+            payload = dict(prediction)
+        else:
+            payload = dict(prediction, query=query)
+        payload.update(model_version=version, batch_size=batch_size)
+        return 200, payload
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one keep-alive connection"""
+        try:
+            while True:
+                try:
+                    request = await read_http_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    await write_json_response(writer, 400, {"error": "Malformed request"}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                self.active_requests += 1
+                if self.request_counts is not None:
+                    self.request_counts[self.slot] += 1
+                try:
+                    status, payload = await self.handle(method, path, body)
+                except Exception as e:
+                    status, payload = 500, {"error": str(e)}
+                finally:
+                    self.active_requests -= 1
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await write_json_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, sock=None):
+        """Accept connections (on `sock` when given, else host:port) until SIGTERM, then drain"""
+        self.start_batchers()
+        if sock is not None:
+            server = await asyncio.start_server(self.handle_connection, sock=sock)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl-C only
+        await stop.wait()
+
+        # Stop accepting, then let requests already being handled finish
+        server.close()
+        deadline = loop.time() + DRAIN_TIMEOUT_S
+        while self.active_requests and loop.time() < deadline:
+            await asyncio.sleep(0.01)
+
+
+def load_generation(model_names):
+    """Load the current version of each model in the parent, without warming up"""
+    models = {}
+    for name in model_names:
+        version = current_version(name)
+        if version is not None:
+            model_dir = version_path(name, version)
+        else:
+            model_dir, version = MODELS_DIR / name, "unregistered"
+            if not model_dir.exists():
+                print(f"WARNING: {name} is not published or trained, its route will return 503")
+                continue
+        models[name] = StaticModel(version, load_predictor(name, model_dir, warmup=False))
+        print(f"Loaded {name} {version}")
+    return models
+
+
+def run_worker(sock, models, request_counts, slot, threads, max_batch, max_wait_ms):
+    """Body of a forked worker: warm up the shared models, then serve until SIGTERM"""
+    import torch
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles Ctrl-C
+    torch.set_num_threads(threads)
+    # Warm up after fork: OpenMP thread pools do not survive fork()
+    for model in models.values():
+        warm_up(model.predictor)
+    app = InferenceApp(models, max_batch, max_wait_ms, request_counts, slot)
+    asyncio.run(app.serve(sock=sock))
+
+
+class PreforkSupervisor:
+    """Parent process: loads models once, forks workers that share them, re-forks on a new version"""
+
+    def __init__(self, model_names, workers, host, port, max_batch=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_BATCH_WAIT_MS, report_interval=MEMORY_REPORT_INTERVAL_S):
+        self.model_names = model_names
+        self.n_workers = workers
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.report_interval = report_interval
+        self.threads = max(1, (os.cpu_count() or 1) // workers)
+        self.sock = None
+        self.models = {}
+        self.generation = 0
+        self.request_counts = None
+        self.workers = {}  # pid -> (generation, slot)
+        self.failed_versions = None  # CURRENT pointers that last failed to load
+        self.stopping = False
+
+    def spawn(self, slot):
+        """Fork one worker of the current generation"""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.sock, self.models, self.request_counts, slot, self.threads,
+                           self.max_batch, self.max_wait_ms)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        self.workers[pid] = (self.generation, slot)
+
+    def start_generation(self):
+        """Load the current models and fork a full set of workers for them"""
+        gc.unfreeze()  # Let the previous generation's objects be collected
+        try:
+            models = load_generation(self.model_names)
+            self.models = models
+        finally:
+            # On failure too: the running generation keeps sharing frozen pages
+            gc.collect()
+            # Move everything to the permanent generation so GC never writes to shared pages
+            gc.freeze()
+        self.generation += 1
+        self.request_counts = multiprocessing.RawArray("q", self.n_workers)
+        for slot in range(self.n_workers):
+            self.spawn(slot)
+        print(f"Generation {self.generation}: {self.n_workers} workers x {self.threads} threads "
+              f"({', '.join(f'{name} {m.version}' for name, m in self.models.items())})")
+
+    def reap(self):
+        """Collect exited workers; respawn current-generation workers that died"""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation, slot = self.workers.pop(pid)
+            if generation == self.generation and not self.stopping:
+                print(f"WARNING: Worker {pid} exited ({status}), respawning")
+                self.spawn(slot)
+
+    def current_versions(self):
+        """{model name: version its CURRENT pointer names (None if unpublished)}"""
+        return {name: current_version(name) for name in self.model_names}
+
+    def version_changed(self):
+        """True if any served model's CURRENT pointer has moved (and not to a version that failed)"""
+        versions = self.current_versions()
+        if versions == self.failed_versions:
+            return False
+        for name, version in versions.items():
+            loaded = self.models.get(name)
+            if version is not None and (loaded is None or loaded.version != version):
+                return True
+        return False
+
+    def swap_generation(self):
+        """Fork workers for the new version, then drain the old ones"""
+        old = [pid for pid, (generation, _) in self.workers.items() if generation == self.generation]
+        self.start_generation()
+        for pid in old:
+            os.kill(pid, signal.SIGTERM)
+        print(f"Draining {len(old)} workers from generation {self.generation - 1}")
+
+    def report_memory(self):
+        """Print RSS / PSS per worker and compare with N independent processes"""
+        rows = []
+        for pid, (generation, slot) in sorted(self.workers.items()):
+            memory = smaps_memory_mb(pid)
+            if memory is None:
+                continue
+            requests = self.request_counts[slot] if generation == self.generation else None
+            rows.append((pid, generation, slot, requests, memory))
+        if not rows:
+            return rows
+
+        print(f"\n{'PID':<8} {'Gen':<4} {'Slot':<5} {'Requests':<9} {'RSS (MB)':<9} {'PSS (MB)':<9} "
+              f"{'Shared':<8} {'Private':<8}")
+        for pid, generation, slot, requests, memory in rows:
+            print(f"{pid:<8} {generation:<4} {slot:<5} {requests if requests is not None else '-':<9} "
+                  f"{memory['rss_mb']:<9.1f} {memory['pss_mb']:<9.1f} {memory['shared_mb']:<8.1f} "
+                  f"{memory['private_mb']:<8.1f}")
+        total_pss = sum(memory["pss_mb"] for *_, memory in rows)
+        parent_pss = (smaps_memory_mb() or {}).get("pss_mb", current_rss_mb() or 0.0)
+        independent = sum(memory["rss_mb"] for *_, memory in rows)
+        print(f"Total PSS (parent + workers): {total_pss + parent_pss:.1f} MB; "
+              f"{len(rows)} independent processes would use ~{independent:.1f} MB")
+        return rows
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self):
+        """Serve until SIGINT / SIGTERM, then drain every worker"""
+        self.sock = socket.create_server((self.host, self.port), backlog=LISTEN_BACKLOG)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        self.start_generation()
+        print(f"Serving on http://{self.host}:{self.port}")
+
+        next_report = time.monotonic() + self.report_interval
+        while not self.stopping:
+            time.sleep(POLL_INTERVAL_S)
+            self.reap()
+            try:
+                if self.version_changed():
+                    self.swap_generation()
+                    self.failed_versions = None
+            except Exception as e:
+                # Keep the current generation serving if the new version fails to load,
+                # and do not retry it until a CURRENT pointer moves again
+                self.failed_versions = self.current_versions()
+                print(f"WARNING: Could not load the new model version: {e}")
+                print("   Serving the previous version until CURRENT changes")
+            if time.monotonic() >= next_report:
+                self.report_memory()
+                next_report = time.monotonic() + self.report_interval
+
+        print("Shutting down, draining workers...")
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGTERM)
+        while self.workers:
+            pid, _ = os.waitpid(-1, 0)
+            self.workers.pop(pid, None)
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve YatriAI models over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=list(ROUTES.values()),
+        help="Registry model names to serve"
+    )
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE, help="Largest micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_BATCH_WAIT_MS, help="Longest a request waits for its batch to fill")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Pre-forked worker processes sharing one copy of the weights (Linux/macOS)"
+    )
+    parser.add_argument(
+        "--report-interval",
+        type=float,
+        default=MEMORY_REPORT_INTERVAL_S,
+        help="Seconds between per-worker memory reports in pre-fork mode"
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        if not hasattr(os, "fork"):
+            print("ERROR: --workers needs os.fork (not available on Windows)")
+            sys.exit(1)
+        PreforkSupervisor(args.models, args.workers, args.host, args.port, args.max_batch,
+                          args.max_wait_ms, args.report_interval).run()
+        return
+
+    app = InferenceApp.from_registry(args.models, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(app.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
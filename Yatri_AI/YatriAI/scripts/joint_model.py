@@ -0,0 +1,243 @@
+"""
+Joint Intent + Entity Model for YatriAI
+
+One shared transformer encoder with two heads: a sequence classification
+head over the [CLS] position for the nine intents of intentClassifier.ts,
+and a BIO token tagging head for the entity types nerService.ts extracts
+(locations, dates, budgets, durations, heritage sites). Serving runs one
+forward pass per query for both.
+
+Entity labels are silver: the regex and keyword rules of nerService.ts,
+mirrored here, tag each training query. Overlapping matches keep the more
+specific type (a heritage site over a location) and then the longer span.
+
+Artifact (models/joint-intent-ner/):
+    config.json, tokenizer files    encoder config and tokenizer
+    joint_model.bin                 state dict of encoder + both heads
+    joint_config.json               intent ids, tag set, max length
+
+Usage:
+    python scripts/train_models.py --model joint
+    python scripts/evaluate_models.py
+
+    predictor = JointPredictor("models/joint-intent-ner")
+    predictor.predict(["Plan a 3 days trip to Victoria Memorial under ₹5000"])
+"""
+
+import json
+import re
+from pathlib import Path
+
+import torch
+
+JOINT_MODEL_DIR = Path("models") / "joint-intent-ner"
+WEIGHTS_FILE = "joint_model.bin"
+CONFIG_FILE = "joint_config.json"
+MAX_LENGTH = 128
+IGNORE_INDEX = -100  # Positions / examples excluded from a head's loss
+
+# Entity types in overlap priority order, with their ExtractedEntities field
+ENTITY_FIELDS = {
+    "HERITAGE_SITE": "heritageSites",
+    "LOCATION": "locations",
+    "DATE": "dates",
+    "DURATION": "durations",
+    "BUDGET": "budgets",
+}
+TAGS = ["O"] + [f"{prefix}-{entity}" for entity in ENTITY_FIELDS for prefix in ("B", "I")]
+
+# Silver label rules, mirroring src/lib/services/nerService.ts
+LOCATION_KEYWORDS = [
+    "Kolkata", "Calcutta", "Howrah", "Dakshineswar", "Kalighat",
+    "Victoria Memorial", "College Street", "Park Street", "Kumartuli",
+    "Princep Ghat", "Marble Palace", "Indian Museum", "Jharkhand", "Ranchi",
+]
+HERITAGE_SITE_KEYWORDS = [
+    "Victoria Memorial", "Howrah Bridge", "Dakshineswar", "Kalighat",
+    "Kumartuli", "College Street", "Princep Ghat", "Marble Palace",
+    "Indian Museum", "Park Street", "heritage site", "monument", "temple",
+]
+ENTITY_PATTERNS = {
+    "HERITAGE_SITE": [
+        re.compile(r"\b" + r"\s+".join(map(re.escape, site.split())) + r"\b", re.I)
+        for site in HERITAGE_SITE_KEYWORDS
+    ],
+    "LOCATION": [re.compile(rf"\b{re.escape(location)}\b", re.I) for location in LOCATION_KEYWORDS],
+    "DATE": [
+        re.compile(r"(today|tomorrow|day after tomorrow)", re.I),
+        re.compile(r"(next week|this week|coming week)", re.I),
+        re.compile(r"(next month|this month)", re.I),
+        re.compile(r"(\d{1,2}/\d{1,2}/\d{2,4})"),
+        re.compile(r"(\d{1,2}-\d{1,2}-\d{2,4})"),
+        re.compile(r"(January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2}", re.I),
+    ],
+    "DURATION": [
+        re.compile(r"(\d+)\s*(day|days)", re.I),
+        re.compile(r"(\d+)\s*(week|weeks)", re.I),
+        re.compile(r"(\d+)\s*(month|months)", re.I),
+        re.compile(r"(weekend|weekend trip)", re.I),
+        re.compile(r"(day trip|one day)", re.I),
+    ],
+    "BUDGET": [
+        re.compile(r"₹\s*(\d+(?:,\d+)*(?:k|K)?)", re.I),
+        re.compile(r"(\d+(?:,\d+)*(?:k|K)?)\s*rupee", re.I),
+        re.compile(r"(budget|budget-friendly|cheap|affordable|low cost)", re.I),
+        re.compile(r"(mid-range|moderate|medium)", re.I),
+        re.compile(r"(luxury|premium|high-end|expensive)", re.I),
+    ],
+}
+
+
+def silver_entity_spans(text):
+    """Non-overlapping (start, end, type) spans from the nerService.ts rules"""
+    priority = {entity: rank for rank, entity in enumerate(ENTITY_FIELDS)}
+    matches = [
+        (match.start(), match.end(), entity)
+        for entity, patterns in ENTITY_PATTERNS.items()
+        for pattern in patterns
+        for match in pattern.finditer(text)
+        if match.end() > match.start()
+    ]
+    matches.sort(key=lambda m: (priority[m[2]], m[0] - m[1]))
+
+    spans = []
+    for start, end, entity in matches:
+        if all(end <= s or start >= e for s, e, _ in spans):
+            spans.append((start, end, entity))
+    return sorted(spans)
+
+
+def tag_offsets(offsets, spans):
+    """BIO tag ids for tokens given their character offsets; special tokens get IGNORE_INDEX"""
+    tag_to_id = {tag: i for i, tag in enumerate(TAGS)}
+    tags = []
+    for start, end in offsets:
+        if start == end:
+            tags.append(IGNORE_INDEX)
+            continue
+        tag = "O"
+        for span_start, span_end, entity in spans:
+            # Tokens overlapping a span belong to it (rule matches can end mid-token)
+            if start < span_end and end > span_start:
+                tag = f"{'B' if start <= span_start else 'I'}-{entity}"
+                break
+        tags.append(tag_to_id[tag])
+    return tags
+
+
+def decode_entities(text, offsets, tag_ids):
+    """Collect (type, text) spans from predicted BIO tags"""
+    spans = []
+    current = None
+    for (start, end), tag_id in zip(offsets, tag_ids):
+        if start == end:
+            continue
+        tag = TAGS[tag_id]
+        if tag == "O":
+            current = None
+            continue
+        prefix, entity = tag.split("-", 1)
+        # An I- tag that does not continue a span of its type starts one
+        if prefix == "I" and current is not None and current[0] == entity:
+            current[2] = end
+        else:
+            current = [entity, start, end]
+            spans.append(current)
+    return [(entity, text[start:end]) for entity, start, end in spans]
+
+
+def entities_by_field(spans):
+    """Group (type, text) spans into the ExtractedEntities shape of nerService.ts"""
+    entities = {field: [] for field in ENTITY_FIELDS.values()}
+    for entity, value in spans:
+        if value not in entities[ENTITY_FIELDS[entity]]:
+            entities[ENTITY_FIELDS[entity]].append(value)
+    return entities
+
+
+class JointIntentEntityModel(torch.nn.Module):
+    """Shared encoder with an intent head on [CLS] and a BIO tagging head per token"""
+
+    def __init__(self, encoder, num_intents, num_tags=len(TAGS), dropout=0.1):
+        super().__init__()
+        self.encoder = encoder
+        hidden_size = encoder.config.hidden_size
+        self.dropout = torch.nn.Dropout(dropout)
+        self.intent_head = torch.nn.Linear(hidden_size, num_intents)
+        self.tag_head = torch.nn.Linear(hidden_size, num_tags)
+
+    def forward(self, input_ids, attention_mask):
+        """(intent logits [batch, intents], tag logits [batch, tokens, tags]) from one encoder pass"""
+        hidden = self.dropout(self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state)
+        return self.intent_head(hidden[:, 0]), self.tag_head(hidden)
+
+    def loss(self, intent_logits, tag_logits, intent_labels, tag_labels, tag_weight=1.0):
+        """Sum of the two heads' cross-entropies; IGNORE_INDEX labels do not contribute"""
+        loss_fn = torch.nn.CrossEntropyLoss(ignore_index=IGNORE_INDEX)
+        loss = tag_weight * loss_fn(tag_logits.reshape(-1, tag_logits.size(-1)), tag_labels.reshape(-1))
+        # A batch of tagging-only examples has no intent labels (CE would be NaN)
+        if (intent_labels != IGNORE_INDEX).any():
+            loss = loss + loss_fn(intent_logits, intent_labels)
+        return loss
+
+    def save(self, model_dir, tokenizer, intent_to_id, base_model):
+        """Write the encoder config, tokenizer, weights and label maps as one artifact"""
+        model_dir = Path(model_dir)
+        model_dir.mkdir(parents=True, exist_ok=True)
+        self.encoder.config.save_pretrained(str(model_dir))
+        tokenizer.save_pretrained(str(model_dir))
+        torch.save(self.state_dict(), model_dir / WEIGHTS_FILE)
+        with open(model_dir / CONFIG_FILE, "w", encoding='utf-8') as f:
+            json.dump({
+                "base_model": base_model,
+                "max_length": MAX_LENGTH,
+                "intent_to_id": intent_to_id,
+                "id_to_intent": {v: k for k, v in intent_to_id.items()},
+                "tags": TAGS,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, model_dir):
+        """Load an artifact written by save(); returns (model, tokenizer, joint config)"""
+        from transformers import AutoConfig, AutoModel, AutoTokenizer
+
+        model_dir = Path(model_dir)
+        with open(model_dir / CONFIG_FILE, "r", encoding='utf-8') as f:
+            config = json.load(f)
+        encoder = AutoModel.from_config(AutoConfig.from_pretrained(str(model_dir)))
+        model = cls(encoder, len(config["intent_to_id"]), len(config["tags"]))
+        model.load_state_dict(torch.load(model_dir / WEIGHTS_FILE, map_location="cpu", weights_only=True))
+        model.eval()
+        return model, AutoTokenizer.from_pretrained(str(model_dir)), config
+
+
+class JointPredictor:
+    """Intent and entities for each query from a single forward pass"""
+
+    def __init__(self, model_dir=JOINT_MODEL_DIR):
+        self.model, self.tokenizer, config = JointIntentEntityModel.load(model_dir)
+        self.id_to_intent = {int(k): v for k, v in config["id_to_intent"].items()}
+        self.max_length = config["max_length"]
+
+    def forward(self, texts):
+        """Raw (intent logits, tag logits, token offsets) for a batch"""
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True,
+                                max_length=self.max_length, return_offsets_mapping=True)
+        offsets = inputs.pop("offset_mapping").tolist()
+        with torch.no_grad():
+            intent_logits, tag_logits = self.model(inputs["input_ids"], inputs["attention_mask"])
+        return intent_logits, tag_logits, offsets
+
+    def predict(self, texts):
+        """Intent, confidence and nerService-shaped entities for each text"""
+        intent_logits, tag_logits, offsets = self.forward(texts)
+        confidence, ids = torch.softmax(intent_logits, dim=-1).max(dim=-1)
+        tag_ids = tag_logits.argmax(dim=-1).tolist()
+        return [
+            {
+                "intent": self.id_to_intent[int(ids[i])],
+                "confidence": float(confidence[i]),
+                "entities": entities_by_field(decode_entities(text, offsets[i], tag_ids[i])),
+            }
+            for i, text in enumerate(texts)
+        ]
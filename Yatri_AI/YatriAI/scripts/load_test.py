@@ -0,0 +1,385 @@
+"""
+Trace-Replay Load Generator for YatriAI
+
+Sends requests on an open-loop schedule: each request starts at its arrival
+time whether or not earlier ones have finished, so a slow server shows up
+as rising latency instead of a lower offered rate. Arrivals are either
+Poisson at --rate for --duration, or the timestamps of a recorded trace.
+
+Request mixes come from training_data/intent_data.json (intent queries) and
+embedding_pairs.json (search queries):
+- inference: POST /api/ml/intent and /api/ml/embeddings on inference_server.py
+- backend:   POST /api/ml/{intent,ner,budget,recommendations} and /gemini on
+             the Node backend
+
+The report covers achieved QPS, p50/p95/p99 latency per route, error rate,
+schedule lag and the histogram of server batch sizes (from the "batch_size"
+field in responses). It is saved to profiles/load-test-<timestamp>.json.
+
+Everything runs offline. `gemini-stub` serves a local stand-in for the
+Gemini API (and any other external API) with LLM-like latency; start the
+backend with GEMINI_BASE_URL pointing at it.
+
+Trace format (JSONL): {"t": seconds since start, "path": "/api/ml/intent", "body": {...}}
+
+Usage:
+    python scripts/load_test.py run --target http://127.0.0.1:8000 --rate 50 --duration 30
+    python scripts/load_test.py run --mode backend --target http://127.0.0.1:3001 --rate 20 --record trace.jsonl
+    python scripts/load_test.py run --trace trace.jsonl --speed 2.0
+    python scripts/load_test.py gemini-stub --port 8089 --latency-ms 800
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+from inference_server import read_http_request, write_json_response
+from run_profiler import PROFILES_DIR
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+TRAINING_DATA_DIR = Path("training_data")
+
+DEFAULT_TARGET = "http://127.0.0.1:8000"
+DEFAULT_RATE = 20.0
+DEFAULT_DURATION_S = 30.0
+REQUEST_TIMEOUT_S = 30.0
+MAX_INFLIGHT = 1000  # Requests past this are counted as dropped instead of sent
+
+# Route weights per mode
+MIXES = {
+    "inference": {"/api/ml/intent": 0.7, "/api/ml/embeddings": 0.3},
+    "backend": {
+        "/api/ml/intent": 0.4,
+        "/api/ml/ner": 0.2,
+        "/api/ml/budget": 0.1,
+        "/api/ml/recommendations": 0.1,
+        "/gemini": 0.2,
+    },
+}
+
+STUB_PORT = 8089
+STUB_LATENCY_MS = 800.0
+STUB_LATENCY_SIGMA = 0.5
+
+
+def load_queries():
+    """Intent queries and embedding search queries from the training data"""
+    with open(TRAINING_DATA_DIR / "intent_data.json", "r", encoding='utf-8') as f:
+        intent_queries = [item["text"] for item in json.load(f)]
+    search_queries = intent_queries
+    pairs_file = TRAINING_DATA_DIR / "embedding_pairs.json"
+    if pairs_file.exists():
+        with open(pairs_file, "r", encoding='utf-8') as f:
+            search_queries = sorted(set(pair["query"] for pair in json.load(f)))
+    return intent_queries, search_queries
+
+
+def make_body(path, rng, intent_queries, search_queries):
+    """Request body for a route, drawn from the training queries"""
+    if path == "/api/ml/embeddings":
+        return {"query": rng.choice(search_queries)}
+    if path == "/api/ml/budget":
+        return {"preferences": {"duration": rng.randint(1, 7), "budget": rng.choice(["budget", "mid-range", "luxury"])}}
+    if path == "/api/ml/recommendations":
+        return {"userId": f"load-test-{rng.randint(1, 500)}"}
+    if path == "/gemini":
+        return {"prompt": rng.choice(intent_queries)}
+    return {"query": rng.choice(intent_queries)}
+
+
+def synthetic_schedule(mode, rate, duration, seed=42):
+    """Poisson arrivals at `rate` per second with routes drawn from the mode's mix"""
+    rng = random.Random(seed)
+    intent_queries, search_queries = load_queries()
+    routes, weights = zip(*MIXES[mode].items())
+    schedule = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        path = rng.choices(routes, weights)[0]
+        schedule.append({"t": t, "path": path, "body": make_body(path, rng, intent_queries, search_queries)})
+        t += rng.expovariate(rate)
+    return schedule
+
+
+def load_trace(trace_file, speed=1.0):
+    """Recorded schedule, with arrival times compressed by `speed`"""
+    schedule = []
+    with open(trace_file, "r", encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                schedule.append({"t": entry["t"] / speed, "path": entry["path"], "body": entry.get("body", {})})
+    return sorted(schedule, key=lambda entry: entry["t"])
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def http_post(host, port, path, body, timeout):
+    """POST JSON on a fresh connection; returns (status, parsed body)"""
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            payload = json.dumps(body).encode("utf-8")
+            writer.write((
+                f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                f"Connection: close\r\n\r\n"
+            ).encode("latin-1") + payload)
+            await writer.drain()
+            status_line = await reader.readline()
+            status = int(status_line.split()[1])
+            length = None
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                if key.strip().lower() == "content-length":
+                    length = int(value.strip())
+            data = await (reader.readexactly(length) if length is not None else reader.read())
+            try:
+                return status, json.loads(data or b"null")
+            except json.JSONDecodeError:
+                return status, None
+        finally:
+            writer.close()
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+async def replay(schedule, target, timeout=REQUEST_TIMEOUT_S, max_inflight=MAX_INFLIGHT):
+    """Send every scheduled request at its arrival time; returns per-request records"""
+    url = urlparse(target)
+    host, port = url.hostname, url.port or 80
+    loop = asyncio.get_running_loop()
+    records = []
+    inflight = 0
+
+    async def send(entry, scheduled_at):
+        nonlocal inflight
+        started = loop.time()
+        record = {"path": entry["path"], "lag_ms": (started - scheduled_at) * 1000}
+        try:
+            status, payload = await http_post(host, port, entry["path"], entry["body"], timeout)
+            record["status"] = status
+            if isinstance(payload, dict) and "batch_size" in payload:
+                record["batch_size"] = payload["batch_size"]
+        except asyncio.TimeoutError:
+            record["status"] = "timeout"
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as e:
+            record["status"] = type(e).__name__
+        finally:
+            inflight -= 1
+        record["latency_ms"] = (loop.time() - started) * 1000
+        record["finished_at"] = loop.time()
+        records.append(record)
+
+    start = loop.time()
+    tasks = []
+    for entry in schedule:
+        scheduled_at = start + entry["t"]
+        delay = scheduled_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if inflight >= max_inflight:
+            records.append({"path": entry["path"], "status": "dropped", "lag_ms": 0.0,
+                            "latency_ms": None, "finished_at": loop.time()})
+            continue
+        inflight += 1
+        tasks.append(asyncio.create_task(send(entry, scheduled_at)))
+    await asyncio.gather(*tasks)
+    return records, start
+
+
+def summarize(records, start, schedule):
+    """Aggregate request records into the load test report"""
+    ok = [r for r in records if r["status"] == 200]
+    elapsed = max((r["finished_at"] for r in records), default=start) - start
+    offered_duration = schedule[-1]["t"] if schedule else 0.0
+
+    def latency_stats(rows):
+        latencies = sorted(r["latency_ms"] for r in rows)
+        return {
+            "count": len(rows),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        }
+
+    routes = {}
+    for path in sorted(set(r["path"] for r in records)):
+        rows = [r for r in records if r["path"] == path]
+        stats = latency_stats([r for r in rows if r["status"] == 200])
+        stats["error_rate"] = 1 - stats["count"] / len(rows)
+        routes[path] = stats
+
+    lags = sorted(r["lag_ms"] for r in records)
+    return {
+        "requests": len(records),
+        "offered_qps": len(schedule) / offered_duration if offered_duration else None,
+        "achieved_qps": len(ok) / elapsed if elapsed else None,
+        "error_rate": 1 - len(ok) / len(records) if records else None,
+        "errors": dict(Counter(str(r["status"]) for r in records if r["status"] != 200)),
+        "latency": latency_stats(ok),
+        "routes": routes,
+        "schedule_lag_p99_ms": percentile(lags, 99),
+        "batch_size_histogram": dict(sorted(Counter(r["batch_size"] for r in ok if "batch_size" in r).items())),
+    }
+
+
+def format_ms(value):
+    """Milliseconds to one decimal, or '-' when missing"""
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_report(report):
+    """Print the load test report"""
+    latency = report["latency"]
+    print("\n" + "-" * 60)
+    print("LOAD TEST RESULTS")
+    print("-" * 60)
+    offered = f"{report['offered_qps']:.1f}" if report["offered_qps"] else "-"
+    achieved = f"{report['achieved_qps']:.1f}" if report["achieved_qps"] else "-"
+    print(f"Requests: {report['requests']}, offered QPS: {offered}, achieved QPS: {achieved}")
+    print(f"Error rate: {report['error_rate']*100:.2f}% {report['errors'] or ''}")
+    if latency["count"]:
+        print(f"Latency: p50 {latency['p50_ms']:.1f}ms, p95 {latency['p95_ms']:.1f}ms, p99 {latency['p99_ms']:.1f}ms")
+    print(f"Schedule lag p99: {report['schedule_lag_p99_ms']:.1f}ms (high values mean the generator fell behind)")
+
+    print(f"\n{'Route':<26} {'OK':<7} {'Errors':<8} {'p50 (ms)':<10} {'p95 (ms)':<10} {'p99 (ms)':<10}")
+    for path, stats in report["routes"].items():
+        print(f"{path:<26} {stats['count']:<7} {stats['error_rate']*100:<7.1f}% {format_ms(stats['p50_ms']):<10} "
+              f"{format_ms(stats['p95_ms']):<10} {format_ms(stats['p99_ms']):<10}")
+
+    histogram = report["batch_size_histogram"]
+    if histogram:
+        print("\nServer batch sizes:")
+        peak = max(histogram.values())
+        for size, count in histogram.items():
+            print(f"  {size:>4}: {'#' * max(1, round(40 * count / peak))} {count}")
+
+
+def run_load_test(args):
+    """Build or load the schedule, replay it and save the report"""
+    print("=" * 60)
+    print("YATRIAI LOAD TEST")
+    print("=" * 60)
+    if args.trace:
+        schedule = load_trace(args.trace, args.speed)
+        print(f"Replaying {len(schedule)} requests from {args.trace} at {args.speed}x against {args.target}")
+    else:
+        schedule = synthetic_schedule(args.mode, args.rate, args.duration, args.seed)
+        print(f"Sending {len(schedule)} {args.mode} requests at {args.rate}/s for {args.duration}s against {args.target}")
+    if not schedule:
+        print("ERROR: Empty schedule")
+        return None
+
+    if args.record:
+        with open(args.record, "w", encoding='utf-8') as f:
+            for entry in schedule:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        print(f"Schedule recorded to: {args.record}")
+
+    records, start = asyncio.run(replay(schedule, args.target, args.timeout, args.max_inflight))
+    report = summarize(records, start, schedule)
+    report.update(target=args.target, mode=args.mode, trace=str(args.trace) if args.trace else None)
+    print_report(report)
+
+    PROFILES_DIR.mkdir(exist_ok=True)
+    report_file = PROFILES_DIR / f"load-test-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(report_file, "w", encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport saved to: {report_file}")
+    return report
+
+
+async def serve_stub(port, latency_ms, sigma, seed=42):
+    """Local stand-in for Gemini and other external HTTP APIs"""
+    rng = random.Random(seed)
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request = await read_http_request(reader)
+                if request is None:
+                    break
+                _, path, headers, _ = request
+                await asyncio.sleep(rng.lognormvariate(0, sigma) * latency_ms / 1000)
+                if path.endswith(":generateContent"):
+                    payload = {
+                        "candidates": [{
+                            "content": {"role": "model", "parts": [{"text": "• Stub response from the local Gemini stand-in."}]},
+                            "finishReason": "STOP",
+                            "index": 0,
+                        }],
+                        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+                    }
+                else:
+                    payload = {}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await write_json_response(writer, 200, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    print(f"Gemini stand-in on http://127.0.0.1:{port} (median latency {latency_ms:.0f}ms)")
+    print(f"Start the backend with GEMINI_BASE_URL=http://127.0.0.1:{port} GEMINI_API_KEY=offline")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator for YatriAI endpoints")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Replay a request schedule against a target")
+    run_parser.add_argument("--target", default=DEFAULT_TARGET, help="Base URL of the server under test")
+    run_parser.add_argument("--mode", choices=sorted(MIXES), default="inference", help="Request mix")
+    run_parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="Offered requests per second")
+    run_parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_S, help="Seconds of arrivals")
+    run_parser.add_argument("--trace", type=Path, help="Replay a recorded JSONL trace instead of Poisson arrivals")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="With --trace, replay this many times faster")
+    run_parser.add_argument("--record", type=Path, help="Save the schedule as a trace for later replays")
+    run_parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT_S, help="Per-request timeout in seconds")
+    run_parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT, help="Drop arrivals beyond this many open requests")
+    run_parser.add_argument("--seed", type=int, default=42)
+
+    stub_parser = subparsers.add_parser("gemini-stub", help="Serve an offline stand-in for Gemini")
+    stub_parser.add_argument("--port", type=int, default=STUB_PORT)
+    stub_parser.add_argument("--latency-ms", type=float, default=STUB_LATENCY_MS, help="Median response latency")
+    stub_parser.add_argument("--sigma", type=float, default=STUB_LATENCY_SIGMA, help="Log-normal latency spread")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        if run_load_test(args) is None:
+            sys.exit(1)
+    else:
+        try:
+            asyncio.run(serve_stub(args.port, args.latency_ms, args.sigma))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
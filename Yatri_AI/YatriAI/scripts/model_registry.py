@@ -0,0 +1,451 @@
+"""
+Versioned Model Registry for YatriAI
+
+Training writes to the working directories models/<name>. Publishing copies
+a working directory into an immutable version directory and then moves the
+"current" pointer with an atomic rename, so a reader sees either the old
+version or the new one, never a half-written model. Rolling back only
+moves the pointer.
+
+Layout:
+    models/registry/<name>/versions/v0001/    weights + manifest.json (read-only)
+    models/registry/<name>/CURRENT            version id, replaced atomically
+    models/registry/<name>/history.jsonl      pointer changes, for rollback
+
+manifest.json records the weight hash, the training config, metrics from
+evaluation_results.json and a benchmark latency measured at publish time.
+
+Serving processes hold models through HotSwapModel. It polls the pointer
+and loads and warms up a new version on a background thread, then swaps a
+single reference. Requests already holding the old model finish on it.
+
+Usage:
+    python scripts/model_registry.py publish --model intent-classifier
+    python scripts/model_registry.py list --model intent-classifier
+    python scripts/model_registry.py rollback --model intent-classifier [--to v0003]
+
+    model = HotSwapModel("intent-classifier")
+    model.start()
+    version, predictor = model.current()
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+MODELS_DIR = Path("models")
+REGISTRY_DIR = MODELS_DIR / "registry"
+EVALUATION_RESULTS_FILE = Path("evaluation_results.json")
+
+# evaluation_results.json section for each registered model
+EVALUATION_KEYS = {
+    "heritage-embeddings": "embeddings",
+    "intent-classifier": "intent",
+    "heritage-reranker": "reranker",
+    "joint-intent-ner": "joint",
+}
+
+POLL_INTERVAL_S = 2.0
+BENCHMARK_REPEATS = 5
+SAMPLE_QUERIES = [
+    "Plan a 3-day itinerary for Kolkata",
+    "I want to book a heritage walk guide",
+    "Show me temples near Dakshineswar",
+    "How much does a 5 day trip cost?",
+    "Tell me about Durga Puja",
+    "How to reach Kolkata by train?",
+    "Buy terracotta handicrafts",
+    "Hello",
+]
+
+
+class IntentPredictor:
+    """Intent classifier with its label mapping and calibration temperature"""
+
+    def __init__(self, model_dir):
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        model_dir = Path(model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.model = AutoModelForSequenceClassification.from_pretrained(str(model_dir))
+        self.model.eval()
+        with open(model_dir / "intent_mapping.json", "r", encoding='utf-8') as f:
+            self.id_to_intent = {int(k): v for k, v in json.load(f)["id_to_intent"].items()}
+        self.temperature = 1.0
+        if (model_dir / "calibration.json").exists():
+            with open(model_dir / "calibration.json", "r", encoding='utf-8') as f:
+                self.temperature = json.load(f)["temperature"]
+
+    def predict(self, texts):
+        """Calibrated intent and confidence for each text"""
+        import torch
+
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True, max_length=128)
+        with torch.no_grad():
+            probs = torch.softmax(self.model(**inputs).logits / self.temperature, dim=-1)
+        confidence, ids = probs.max(dim=-1)
+        return [
+            {"intent": self.id_to_intent[int(i)], "confidence": float(c)}
+            for i, c in zip(ids, confidence)
+        ]
+
+
+class EmbeddingPredictor:
+    """Sentence embeddings model"""
+
+    def __init__(self, model_dir):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(str(model_dir))
+
+    def predict(self, texts):
+        """Normalized embedding for each text"""
+        return self.model.encode(texts, normalize_embeddings=True)
+
+
+def joint_predictor(model_dir):
+    """Joint intent + entity model (imported lazily, it needs torch at import time)"""
+    from joint_model import JointPredictor
+
+    return JointPredictor(model_dir)
+
+
+def monument_predictor(model_dir):
+    """Monument photo index; predict() takes images and recognizes them in one batch"""
+    from monument_index import MonumentRecognizer
+
+    return MonumentRecognizer.load(model_dir)
+
+
+PREDICTORS = {
+    "heritage-embeddings": EmbeddingPredictor,
+    "intent-classifier": IntentPredictor,
+    "joint-intent-ner": joint_predictor,
+    "monument-index": monument_predictor,
+}
+
+
+def warm_up(predictor):
+    """Run sample batches so the first real request does not pay one-time setup costs"""
+    samples = getattr(predictor, "sample_inputs", SAMPLE_QUERIES)
+    predictor.predict(samples)
+    for sample in samples:
+        predictor.predict([sample])
+
+
+def load_predictor(name, model_dir, warmup=True):
+    """Load a model directory as a predictor, warmed up off the request path by default"""
+    predictor = PREDICTORS[name](model_dir)
+    if warmup:
+        warm_up(predictor)
+    return predictor
+
+
+def benchmark_latency(predictor):
+    """Single-query latency of a warmed-up predictor, in milliseconds"""
+    samples = getattr(predictor, "sample_inputs", SAMPLE_QUERIES)
+    timings = []
+    for _ in range(BENCHMARK_REPEATS):
+        for sample in samples:
+            start = time.perf_counter()
+            predictor.predict([sample])
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        "queries": len(timings),
+    }
+
+
+def hash_directory(directory, exclude=("manifest.json",)):
+    """SHA-256 per file and over the whole directory (relative paths + contents)"""
+    directory = Path(directory)
+    overall = hashlib.sha256()
+    files = {}
+    for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+        relative = path.relative_to(directory).as_posix()
+        if relative in exclude:
+            continue
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        files[relative] = digest.hexdigest()
+        overall.update(relative.encode("utf-8"))
+        overall.update(digest.digest())
+    return overall.hexdigest(), files
+
+
+def read_json(path, default=None):
+    """Load a JSON file, or `default` when it does not exist"""
+    path = Path(path)
+    if not path.exists():
+        return default
+    with open(path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def versions_dir(name):
+    """Directory holding every published version of a model"""
+    return REGISTRY_DIR / name / "versions"
+
+
+def list_versions(name):
+    """Published version ids, oldest first"""
+    if not versions_dir(name).exists():
+        return []
+    return sorted(p.name for p in versions_dir(name).iterdir() if p.is_dir() and p.name.startswith("v"))
+
+
+def current_version(name):
+    """Version id the CURRENT pointer names (None if nothing is published)"""
+    pointer = REGISTRY_DIR / name / "CURRENT"
+    try:
+        return pointer.read_text(encoding='utf-8').strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_path(name, version):
+    """Directory of one published version"""
+    return versions_dir(name) / version
+
+
+def set_current(name, version, reason):
+    """Atomically point CURRENT at `version` and append the change to history.jsonl"""
+    if not version_path(name, version).exists():
+        raise ValueError(f"Unknown version {version} for {name}")
+
+    registry = REGISTRY_DIR / name
+    previous = current_version(name)
+    tmp_pointer = registry / f"CURRENT.{os.getpid()}.tmp"
+    with open(tmp_pointer, "w", encoding='utf-8') as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, registry / "CURRENT")
+
+    with open(registry / "history.jsonl", "a", encoding='utf-8') as f:
+        f.write(json.dumps({
+            "version": version,
+            "previous": previous,
+            "reason": reason,
+            "at": datetime.now().isoformat(timespec="seconds"),
+        }) + "\n")
+
+
+def publish(name, source_dir=None, evaluation_file=EVALUATION_RESULTS_FILE, activate=True):
+    """Copy a trained model into a new immutable version and (by default) make it current"""
+    source_dir = Path(source_dir or MODELS_DIR / name)
+    if not source_dir.exists():
+        print(f"ERROR: Model not found at {source_dir}")
+        return None
+
+    print(f"Publishing {source_dir}...")
+    versions_dir(name).mkdir(parents=True, exist_ok=True)
+    staging = versions_dir(name) / f".staging-{os.getpid()}"
+    if staging.exists():
+        shutil.rmtree(staging)
+    shutil.copytree(source_dir, staging, ignore=shutil.ignore_patterns("manifest.json", "checkpoint-*"))
+
+    weights_hash, files = hash_directory(staging)
+    training_manifest = read_json(source_dir / "manifest.json", {})
+    training_state = read_json(source_dir / "training_state.json", {})
+
+    # Only attach evaluation metrics that were computed after this model was trained
+    evaluation = None
+    evaluation_results = read_json(evaluation_file)
+    section = (evaluation_results or {}).get(EVALUATION_KEYS.get(name))
+    if section:
+        trained_at = max(p.stat().st_mtime for p in source_dir.rglob("*") if p.is_file())
+        if Path(evaluation_file).stat().st_mtime >= trained_at:
+            evaluation = section
+        else:
+            print(f"⚠️  {evaluation_file} predates this model; publishing without metrics")
+
+    benchmark = None
+    if name in PREDICTORS:
+        print("Benchmarking latency...")
+        benchmark = benchmark_latency(load_predictor(name, staging))
+        print(f"   p50 {benchmark['p50_ms']:.2f}ms, p95 {benchmark['p95_ms']:.2f}ms")
+
+    manifest = {
+        "name": name,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "source_dir": str(source_dir),
+        "weights_sha256": weights_hash,
+        "files": files,
+        "training_config": training_manifest.get("training_config"),
+        "hyperparameter_search": training_manifest.get("hyperparameter_search"),
+        "training_runs": training_state.get("runs", []),
+        "evaluation": evaluation,
+        "benchmark": benchmark,
+    }
+
+    # Claim the next version id; rename fails if another publisher took it first
+    while True:
+        existing = list_versions(name)
+        version = f"v{int(existing[-1][1:]) + 1 if existing else 1:04d}"
+        manifest["version"] = version
+        with open(staging / "manifest.json", "w", encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.rename(staging, version_path(name, version))
+            break
+        except OSError:
+            if not version_path(name, version).exists():
+                raise
+
+    for path in version_path(name, version).rglob("*"):
+        if path.is_file():
+            path.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    if activate:
+        set_current(name, version, reason="publish")
+    print(f"✅ Published {name} {version} (weights {weights_hash[:12]}){' and made it current' if activate else ''}")
+    return version
+
+
+def rollback(name, to_version=None):
+    """Point CURRENT at `to_version`, or at the version that was current before this one"""
+    if to_version is None:
+        current = current_version(name)
+        history = []
+        history_file = REGISTRY_DIR / name / "history.jsonl"
+        if history_file.exists():
+            with open(history_file, "r", encoding='utf-8') as f:
+                history = [json.loads(line) for line in f if line.strip()]
+        to_version = next(
+            (entry["previous"] for entry in reversed(history) if entry["version"] == current and entry["previous"]),
+            None,
+        )
+        if to_version is None:
+            print(f"ERROR: No earlier version of {name} to roll back to")
+            return None
+
+    set_current(name, to_version, reason="rollback")
+    print(f"✅ {name} now serving {to_version}")
+    return to_version
+
+
+class HotSwapModel:
+    """Serves the registry's current version of a model and hot-swaps when the pointer moves"""
+
+    def __init__(self, name, poll_interval=POLL_INTERVAL_S, on_swap=None, fallback_dir=None):
+        self.name = name
+        self.poll_interval = poll_interval
+        self.on_swap = on_swap
+        self.fallback_dir = fallback_dir
+        self._active = (None, None)
+        self.failed_version = None  # Not retried until CURRENT moves to another version
+        self._stop = threading.Event()
+        self._thread = None
+
+    def current(self):
+        """(version, predictor); keep the predictor for the whole request"""
+        return self._active
+
+    def refresh(self):
+        """Load, warm up and swap in the current version if it changed; True if swapped"""
+        version = current_version(self.name)
+        if version != self.failed_version:
+            self.failed_version = None  # CURRENT moved: a later move back retries it
+        if version is None:
+            # Nothing published yet: serve the working directory (development only)
+            if self._active[1] is not None or not self.fallback_dir or not Path(self.fallback_dir).exists():
+                return False
+            version, model_dir = "unregistered", self.fallback_dir
+        elif version in (self._active[0], self.failed_version):
+            return False
+        else:
+            model_dir = version_path(self.name, version)
+        try:
+            predictor = load_predictor(self.name, model_dir)
+        except Exception:
+            self.failed_version = version
+            raise
+        previous = self._active[0]
+        # One reference assignment: requests see either the old or the new model
+        self._active = (version, predictor)
+        if self.on_swap:
+            self.on_swap(previous, version)
+        return True
+
+    def start(self):
+        """Load the current version now, then watch the pointer on a daemon thread"""
+        self.refresh()
+        self._thread = threading.Thread(target=self._watch, name=f"watch-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching the pointer"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the old version if the new one fails to load
+                print(f"WARNING: Could not load {self.name} {self.failed_version}: {e}")
+                print(f"   Serving {self._active[0]} until CURRENT changes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="YatriAI model registry")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    publish_parser = subparsers.add_parser("publish", help="Publish a trained model as a new version")
+    publish_parser.add_argument("--model", required=True, help="Model name, e.g. intent-classifier")
+    publish_parser.add_argument("--source", type=Path, help="Model directory (default: models/<name>)")
+    publish_parser.add_argument("--no-activate", action="store_true", help="Publish without moving CURRENT")
+
+    list_parser = subparsers.add_parser("list", help="List published versions")
+    list_parser.add_argument("--model", required=True)
+
+    rollback_parser = subparsers.add_parser("rollback", help="Point CURRENT at an earlier version")
+    rollback_parser.add_argument("--model", required=True)
+    rollback_parser.add_argument("--to", help="Version id (default: the previously current version)")
+
+    args = parser.parse_args()
+    if args.command == "publish":
+        if publish(args.model, args.source, activate=not args.no_activate) is None:
+            sys.exit(1)
+    elif args.command == "rollback":
+        if rollback(args.model, args.to) is None:
+            sys.exit(1)
+    else:
+        current = current_version(args.model)
+        print(f"{'Version':<9} {'Created':<21} {'Weights':<14} {'p95 (ms)':<10} {'Accuracy':<10}")
+        print("-" * 66)
+        for version in list_versions(args.model):
+            manifest = read_json(version_path(args.model, version) / "manifest.json", {})
+            benchmark = manifest.get("benchmark") or {}
+            accuracy = (manifest.get("evaluation") or {}).get("accuracy")
+            p95 = f"{benchmark['p95_ms']:.2f}" if benchmark else "-"
+            acc = f"{accuracy:.4f}" if accuracy is not None else "-"
+            marker = " <- current" if version == current else ""
+            print(f"{version:<9} {manifest.get('created_at', '-'):<21} {manifest.get('weights_sha256', '')[:12]:<14} "
+                  f"{p95:<10} {acc:<10}{marker}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""
+Monument Photo Recognition Index for YatriAI
+
+Embeds a reference image set for each catalog heritage site with the CLIP
+ViT-B/32 image encoder (CPU-friendly, via sentence-transformers) into a
+compact nearest-neighbour index: one float16 matrix of normalized
+embeddings, rows grouped by site. A query image is embedded once and
+scored against every reference with a single matrix product; its score for
+a site is the best similarity to any of that site's references.
+
+An image is recognized locally only when its best score clears
+min_similarity and beats the runner-up site by min_margin; otherwise the
+caller falls through to the LLM (pictureDeckController.analyzeMonument).
+`calibrate` sets min_similarity from leave-one-out queries over the
+reference set (known monuments) and leave-site-out queries (stand-ins for
+monuments that are not in the index), at a target precision.
+
+Reference images:
+    training_data/monument_images/<site-slug>/*.jpg   e.g. victoria-memorial/
+
+Index (models/monument-index/):
+    embeddings.npy    float16 [references, dim], grouped by site
+    index.json        encoder, sites, row offsets, source hash, thresholds
+
+Usage:
+    python scripts/monument_index.py build [--force]
+    python scripts/monument_index.py calibrate --target-precision 0.95
+    python scripts/monument_index.py query photo1.jpg photo2.jpg
+
+    recognizer = MonumentRecognizer.load()
+    results = recognizer.recognize([image_base64, Path("photo.jpg")])  # Strings are base64, never paths
+"""
+
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from prepare_training_data import MOCK_DATA_FILE, extract_ts_data
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+TRAINING_DATA_DIR = Path("training_data")
+MODELS_DIR = Path("models")
+MONUMENT_IMAGES_DIR = TRAINING_DATA_DIR / "monument_images"
+MONUMENT_INDEX_DIR = MODELS_DIR / "monument-index"
+
+IMAGE_ENCODER = "clip-ViT-B-32"
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+EMBED_BATCH_SIZE = 32
+
+# Defaults until `calibrate` fits min_similarity on the reference set
+MIN_SIMILARITY = 0.85
+MIN_MARGIN = 0.02
+TARGET_PRECISION = 0.95
+CALIBRATION_MIN_SUPPORT = 5
+
+# Destination categories in mockData.ts (extract_ts_data also matches products)
+SITE_CATEGORIES = {"heritage", "temples", "culture", "literature", "markets", "food"}
+
+
+def slugify(name):
+    """Directory name for a catalog site, e.g. 'Kalighat Temple' -> 'kalighat-temple'"""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def catalog_sites():
+    """Catalog destinations from mockData.ts, keyed by slug"""
+    if not MOCK_DATA_FILE.exists():
+        return {}
+    destinations, _, _ = extract_ts_data()
+    return {
+        slugify(d["name"]): {"name": d["name"], "category": d["category"]}
+        for d in destinations
+        if d["category"] in SITE_CATEGORIES
+    }
+
+
+def reference_images(images_dir=MONUMENT_IMAGES_DIR):
+    """{site slug: [image paths]} for every non-empty site directory"""
+    references = {}
+    if not images_dir.exists():
+        return references
+    for site_dir in sorted(p for p in images_dir.iterdir() if p.is_dir()):
+        paths = sorted(p for p in site_dir.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if paths:
+            references[site_dir.name] = paths
+    return references
+
+
+def source_hash(references):
+    """SHA-1 over reference image paths and contents"""
+    digest = hashlib.sha1()
+    for site, paths in sorted(references.items()):
+        for path in paths:
+            digest.update(path.as_posix().encode("utf-8"))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def image_bytes(data):
+    """Raw image bytes from a base64 or data URL string; ValueError if it is not an image"""
+    from PIL import Image, UnidentifiedImageError
+
+    # Same data URL handling as generateMonumentStory in geminiService.ts
+    data = re.sub(r"^data:image/[a-z]+;base64,", "", data.strip())
+    try:
+        raw = base64.b64decode(data, validate=True)
+        Image.open(io.BytesIO(raw))  # Reads the header only
+    except (binascii.Error, UnidentifiedImageError) as e:
+        raise ValueError("not a base64 or data URL image") from e
+    return raw
+
+
+def decode_image(image):
+    """PIL RGB image from a PIL image, raw bytes, a file Path or a base64 / data URL string
+
+    Strings are never treated as file paths: they come from HTTP clients.
+    """
+    from PIL import Image
+
+    if isinstance(image, Image.Image):
+        return image.convert("RGB")
+    if isinstance(image, Path):
+        return Image.open(image).convert("RGB")
+    if isinstance(image, str):
+        image = image_bytes(image)
+    if isinstance(image, (bytes, bytearray)):
+        return Image.open(io.BytesIO(image)).convert("RGB")
+    raise TypeError(f"unsupported image input: {type(image).__name__}")
+
+
+def load_encoder(name=IMAGE_ENCODER):
+    """CLIP image encoder (sentence-transformers)"""
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(name, device="cpu")
+
+
+def embed_images(encoder, images, batch_size=EMBED_BATCH_SIZE):
+    """Normalized float32 embeddings for a list of decoded images"""
+    if not images:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(
+        encoder.encode(images, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True),
+        dtype=np.float32,
+    )
+
+
+class MonumentRecognizer:
+    """Nearest-neighbour monument recognition over per-site reference embeddings"""
+
+    def __init__(self, encoder, embeddings, sites, offsets,
+                 min_similarity=MIN_SIMILARITY, min_margin=MIN_MARGIN):
+        self.encoder = encoder
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.sites = sites  # [{"slug", "name", "category"}] in row order
+        self.offsets = np.asarray(offsets, dtype=np.int64)  # First row of each site
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.last_timings = {}
+
+    @classmethod
+    def load(cls, index_dir=MONUMENT_INDEX_DIR, encoder=None):
+        """Load an index written by build_index(), with its calibrated thresholds"""
+        index_dir = Path(index_dir)
+        with open(index_dir / "index.json", "r", encoding='utf-8') as f:
+            meta = json.load(f)
+        embeddings = np.load(index_dir / "embeddings.npy")
+        thresholds = meta.get("thresholds", {})
+        return cls(
+            encoder or load_encoder(meta["encoder"]), embeddings, meta["sites"], meta["offsets"],
+            thresholds.get("min_similarity", MIN_SIMILARITY), thresholds.get("min_margin", MIN_MARGIN),
+        )
+
+    @property
+    def sample_inputs(self):
+        """Blank images for warm-up and benchmarking (see model_registry.py)"""
+        from PIL import Image
+
+        return [Image.new("RGB", (224, 224), color) for color in ("white", "gray", "black")]
+
+    def site_scores(self, query_embeddings, exclude_rows=None):
+        """[queries, sites] best similarity to each site's references"""
+        similarities = query_embeddings @ self.embeddings.T
+        if exclude_rows is not None:
+            similarities[np.arange(len(similarities)), exclude_rows] = -np.inf
+        return np.maximum.reduceat(similarities, self.offsets, axis=1)
+
+    def decide(self, scores):
+        """Best site, score, margin over the runner-up and whether to accept it, per query"""
+        order = np.argsort(-scores, axis=1)
+        rows = np.arange(len(scores))
+        best = scores[rows, order[:, 0]]
+        second = scores[rows, order[:, 1]] if scores.shape[1] > 1 else np.full(len(scores), -1.0)
+        margin = best - second
+        recognized = (best >= self.min_similarity) & (margin >= self.min_margin)
+        return order[:, 0], best, margin, recognized
+
+    def recognize(self, images):
+        """Monument match per image; "recognized": False means fall through to the LLM"""
+        start = time.perf_counter()
+        # An undecodable image fails on its own, not the whole batch
+        results = [None] * len(images)
+        decoded, positions = [], []
+        for i, image in enumerate(images):
+            try:
+                decoded.append(decode_image(image))
+                positions.append(i)
+            except Exception as e:
+                results[i] = {"site": None, "name": None, "recognized": False, "error": f"Invalid image: {e}"}
+        decoded_at = time.perf_counter()
+
+        embedded_at = decoded_at
+        if decoded:
+            query_embeddings = embed_images(self.encoder, decoded)
+            embedded_at = time.perf_counter()
+            best, score, margin, recognized = self.decide(self.site_scores(query_embeddings))
+            for j, i in enumerate(positions):
+                results[i] = {
+                    "site": self.sites[best[j]]["slug"],
+                    "name": self.sites[best[j]]["name"],
+                    "score": float(score[j]),
+                    "margin": float(margin[j]),
+                    "recognized": bool(recognized[j]),
+                }
+        self.last_timings = {
+            "decode_ms": (decoded_at - start) * 1000,
+            "embed_ms": (embedded_at - decoded_at) * 1000,
+            "search_ms": (time.perf_counter() - embedded_at) * 1000,
+            "images": len(images),
+        }
+        return results
+
+    def predict(self, images):
+        """Alias of recognize() for the model registry and inference server"""
+        return self.recognize(images)
+
+
+def build_index(force=False, images_dir=MONUMENT_IMAGES_DIR, index_dir=MONUMENT_INDEX_DIR, encoder=None):
+    """Embed the reference images and save the index unless it is already up to date"""
+    references = reference_images(images_dir)
+    if not references:
+        print(f"ERROR: No reference images found in {images_dir}/<site-slug>/")
+        return None
+
+    digest = source_hash(references)
+    index_file = index_dir / "index.json"
+    if not force and index_file.exists():
+        with open(index_file, "r", encoding='utf-8') as f:
+            if json.load(f).get("source_hash") == digest:
+                print(f"Index is up to date: {index_dir}")
+                return MonumentRecognizer.load(index_dir, encoder)
+
+    catalog = catalog_sites()
+    for slug in sorted(set(catalog) - set(references)):
+        print(f"WARNING: No reference images for catalog site '{catalog[slug]['name']}' ({images_dir / slug})")
+
+    encoder = encoder or load_encoder()
+    print(f"Embedding {sum(len(p) for p in references.values())} reference images for {len(references)} sites...")
+    start = time.perf_counter()
+    sites, offsets, blocks, image_paths = [], [], [], []
+    row = 0
+    for slug, paths in references.items():
+        entry = catalog.get(slug)
+        if entry is None:
+            print(f"WARNING: '{slug}' is not a catalog destination, indexing it under its directory name")
+            entry = {"name": slug.replace("-", " ").title(), "category": "heritage"}
+        sites.append(dict(entry, slug=slug))
+        offsets.append(row)
+        blocks.append(embed_images(encoder, [decode_image(path) for path in paths]))
+        image_paths.extend(path.as_posix() for path in paths)
+        row += len(paths)
+    embeddings = np.concatenate(blocks).astype(np.float16)
+    elapsed = time.perf_counter() - start
+
+    index_dir.mkdir(parents=True, exist_ok=True)
+    np.save(index_dir / "embeddings.npy", embeddings)
+    with open(index_file, "w", encoding='utf-8') as f:
+        json.dump({
+            "encoder": IMAGE_ENCODER,
+            "dim": int(embeddings.shape[1]),
+            "source_hash": digest,
+            "sites": sites,
+            "offsets": offsets,
+            "images": image_paths,
+            "thresholds": {"min_similarity": MIN_SIMILARITY, "min_margin": MIN_MARGIN, "calibrated": False},
+        }, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ Indexed {len(embeddings)} images in {elapsed:.1f}s "
+          f"({embeddings.nbytes / 1024:.1f} KB, {embeddings.shape[1]}-d float16)")
+    print(f"   Saved to: {index_dir}")
+    return MonumentRecognizer.load(index_dir, encoder)
+
+
+def calibrate(recognizer, target_precision=TARGET_PRECISION, index_dir=MONUMENT_INDEX_DIR):
+    """Fit min_similarity so locally accepted answers meet target precision; saves it to the index"""
+    embeddings = recognizer.embeddings
+    site_of_row = np.repeat(np.arange(len(recognizer.sites)), np.diff(np.append(recognizer.offsets, len(embeddings))))
+
+    # Known monuments: each reference queried against all the others
+    scores = recognizer.site_scores(embeddings.copy(), exclude_rows=np.arange(len(embeddings)))
+    best = scores.argmax(axis=1)
+    known_score = scores[np.arange(len(scores)), best]
+    known_correct = best == site_of_row
+    # Unknown monuments: each reference with its own site removed (every acceptance is wrong)
+    scores[np.arange(len(scores)), site_of_row] = -np.inf
+    unknown_score = scores.max(axis=1)
+
+    confidences = np.concatenate([known_score, unknown_score])
+    correct = np.concatenate([known_correct, np.zeros(len(unknown_score), dtype=bool)])
+    finite = np.isfinite(confidences)
+    confidences, correct = confidences[finite], correct[finite]
+
+    threshold = None
+    for candidate in np.unique(confidences):
+        accepted = confidences >= candidate
+        if accepted.sum() < CALIBRATION_MIN_SUPPORT:
+            break
+        if correct[accepted].mean() >= target_precision:
+            threshold = float(candidate)
+            break
+
+    print("\n" + "-" * 60)
+    print("MONUMENT RECOGNITION CALIBRATION")
+    print("-" * 60)
+    print(f"Leave-one-out top-1 accuracy: {known_correct.mean():.4f} ({len(known_correct)} references)")
+    if threshold is None:
+        print(f"WARNING: No threshold reaches {target_precision:.2f} precision; keeping {recognizer.min_similarity:.3f}")
+        print("   Add more reference images per site")
+        return None
+
+    accepted_known = known_score >= threshold
+    local_rate = float(accepted_known.mean())
+    precision = float(correct[confidences >= threshold].mean())
+    print(f"min_similarity: {threshold:.4f} (precision {precision:.4f} at target {target_precision:.2f})")
+    print(f"Known monuments recognized locally: {local_rate * 100:.1f}% (the rest go to the LLM)")
+    print(f"Unknown monuments wrongly accepted: {(unknown_score >= threshold).mean() * 100:.1f}%")
+
+    recognizer.min_similarity = threshold
+    index_file = Path(index_dir) / "index.json"
+    with open(index_file, "r", encoding='utf-8') as f:
+        meta = json.load(f)
+    meta["thresholds"] = {
+        "min_similarity": threshold,
+        "min_margin": recognizer.min_margin,
+        "calibrated": True,
+        "target_precision": target_precision,
+        "precision": precision,
+        "known_local_rate": local_rate,
+    }
+    with open(index_file, "w", encoding='utf-8') as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+    return meta["thresholds"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monument photo recognition index for YatriAI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Embed reference images into the index")
+    build_parser.add_argument("--force", action="store_true", help="Rebuild even if the images are unchanged")
+    build_parser.add_argument("--no-calibrate", action="store_true", help="Keep the default thresholds")
+    build_parser.add_argument("--target-precision", type=float, default=TARGET_PRECISION,
+                              help="Precision of local recognition when calibrating")
+
+    calibrate_parser = subparsers.add_parser("calibrate", help="Fit the acceptance threshold on the reference set")
+    calibrate_parser.add_argument("--target-precision", type=float, default=TARGET_PRECISION,
+                                  help="Precision of local recognition")
+
+    query_parser = subparsers.add_parser("query", help="Recognize monument photos")
+    query_parser.add_argument("images", nargs="+", type=Path, help="Image files")
+
+    args = parser.parse_args()
+    try:
+        import sentence_transformers  # noqa: F401
+        import PIL  # noqa: F401
+    except ImportError:
+        print("ERROR: Please install required packages:")
+        print("   pip install sentence-transformers pillow")
+        sys.exit(1)
+
+    if args.command == "build":
+        recognizer = build_index(force=args.force)
+        if recognizer is not None and not args.no_calibrate:
+            calibrate(recognizer, args.target_precision)
+        return
+
+    if not (MONUMENT_INDEX_DIR / "index.json").exists():
+        print(f"ERROR: Index not found at {MONUMENT_INDEX_DIR}, run build first")
+        sys.exit(1)
+    recognizer = MonumentRecognizer.load()
+
+    if args.command == "calibrate":
+        calibrate(recognizer, args.target_precision)
+        return
+
+    recognizer.recognize(recognizer.sample_inputs[:1])  # Warm up before timing
+    results = recognizer.recognize(args.images)
+    timings = recognizer.last_timings
+    for path, result in zip(args.images, results):
+        if "error" in result:
+            print(f"{path}: {result['error']}")
+            continue
+        verdict = "✅ recognized" if result["recognized"] else "→ LLM fallback"
+        print(f"{path}: {result['name']} (score {result['score']:.3f}, margin {result['margin']:.3f}) {verdict}")
+    print(f"\n{len(results)} images: decode {timings['decode_ms']:.1f}ms, embed {timings['embed_ms']:.1f}ms, "
+          f"search {timings['search_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
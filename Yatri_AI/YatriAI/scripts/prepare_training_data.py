@@ -3,13 +3,20 @@ Prepare Training Data from YatriAI Mock Data
 
 This script extracts data from mockData.ts and creates training datasets
 for embeddings and intent classification.
+
+Usage:
+    python scripts/prepare_training_data.py
+    python scripts/prepare_training_data.py --profile [--trace-allocations]
 """
 
+import argparse
 import json
 import re
 import sys
 from pathlib import Path
 
+from run_profiler import RunProfiler, add_profile_arguments
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     import io
@@ -330,6 +337,16 @@ def create_intent_training_data():
         {"text": "Tell me about yourself", "intent": "general_chat"},
     ]
     
+    # Keep production queries labeled through scripts/active_learning.py
+    labeled_file = TRAINING_DATA_DIR / "labeled_queries.json"
+    if labeled_file.exists():
+        with open(labeled_file, "r", encoding='utf-8') as f:
+            labeled_queries = json.load(f)
+        known = {d["text"].strip().lower() for d in training_data}
+        added = [q for q in labeled_queries if q["text"].strip().lower() not in known]
+        training_data.extend(added)
+        print(f"   Included {len(added)} new labeled production queries ({len(labeled_queries)} labeled in total)")
+    
     with open(TRAINING_DATA_DIR / "intent_data.json", "w", encoding='utf-8') as f:
         json.dump(training_data, f, indent=2, ensure_ascii=False)
     
@@ -340,22 +357,34 @@ def create_intent_training_data():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Prepare YatriAI training data")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    profiler = RunProfiler("prepare_training_data", enabled=args.profile, torch_trace=args.torch_trace,
+                           trace_allocations=args.trace_allocations)
+    
     print("Preparing Training Data for YatriAI Models\n")
     print("=" * 50)
     
     # Extract data from TypeScript file
-    try:
-        destinations, guides, itineraries = extract_ts_data()
-    except Exception as e:
-        print(f"WARNING: Could not extract from TypeScript file: {e}")
-        print("   Using synthetic data instead...")
-        destinations, guides, itineraries = [], [], []
+    with profiler.stage("extract_ts_data"):
+        try:
+            destinations, guides, itineraries = extract_ts_data()
+        except Exception as e:
+            print(f"WARNING: Could not extract from TypeScript file: {e}")
+            print("   Using synthetic data instead...")
+            destinations, guides, itineraries = [], [], []
     
     # Create embedding training data
-    create_embedding_training_data(destinations, guides, itineraries)
+    with profiler.stage("create_embedding_data"):
+        embedding_pairs = create_embedding_training_data(destinations, guides, itineraries)
     
     # Create intent training data
-    create_intent_training_data()
+    with profiler.stage("create_intent_data"):
+        intent_data = create_intent_training_data()
+    
+    profiler.record("embedding_pairs", len(embedding_pairs))
+    profiler.record("intent_examples", len(intent_data))
     
     print("\n" + "=" * 50)
     print("SUCCESS: Training data preparation complete!")
@@ -363,6 +392,7 @@ def main():
     print("\nNext step: Run training script")
     print("   python scripts/train_models.py --model embeddings")
     print("   python scripts/train_models.py --model intent")
+    profiler.write()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,273 @@
+"""
+Retrieval for YatriAI
+
+Two-stage dense retrieval: the heritage-embeddings bi-encoder recalls the
+top-N documents by cosine similarity, then the heritage-reranker
+cross-encoder rescores the candidates in small batches until the latency
+budget would be exceeded; candidates it did not reach keep their bi-encoder
+order after the reranked ones.
+
+Sparse retrieval: a prebuilt BM25 inverted index (see
+scripts/build_search_index.py) with per-posting weights computed at build
+time, so a query only walks the postings of its own terms. Hybrid search
+fuses the sparse and dense rankings with reciprocal rank fusion.
+
+Usage:
+    retriever = TwoStageRetriever.load(documents, top_n=20, latency_budget_ms=50)
+    hits = retriever.search("temples in Kolkata", k=5)
+
+    hybrid = HybridRetriever.load()
+    hits = hybrid.search("Ekdalia Evergreen pandal", k=5)
+"""
+
+import json
+import math
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+MODELS_DIR = Path("models")
+EMBEDDINGS_MODEL_DIR = MODELS_DIR / "heritage-embeddings"
+RERANKER_MODEL_DIR = MODELS_DIR / "heritage-reranker"
+
+RERANK_TOP_N = 20
+RERANK_LATENCY_BUDGET_MS = 50.0
+RERANK_BATCH_SIZE = 8
+RERANKER_MAX_LENGTH = 256
+
+SEARCH_INDEX_FILE = MODELS_DIR / "search-index" / "bm25_index.json"
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # Standard reciprocal rank fusion constant
+FUSION_CANDIDATES = 50  # Results taken from each ranker before fusion
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it me my of on or show the to what where with".split()
+)
+
+
+def ranking_metrics(ranked, relevant, k=10):
+    """MRR, nDCG@k, Recall@1 and Recall@5 for one ranked list of document ids"""
+    reciprocal_rank = next((1.0 / (rank + 1) for rank, doc in enumerate(ranked) if doc in relevant), 0.0)
+    dcg = sum(1.0 / math.log2(rank + 2) for rank, doc in enumerate(ranked[:k]) if doc in relevant)
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return {
+        "mrr": reciprocal_rank,
+        f"ndcg@{k}": dcg / ideal if ideal else 0.0,
+        "recall@1": len(set(ranked[:1]) & relevant) / len(relevant),
+        "recall@5": len(set(ranked[:5]) & relevant) / len(relevant),
+    }
+
+
+class TwoStageRetriever:
+    """Bi-encoder recall over a fixed document set, optionally reranked by a cross-encoder"""
+
+    def __init__(self, bi_encoder, documents, reranker=None, reranker_tokenizer=None,
+                 top_n=RERANK_TOP_N, latency_budget_ms=RERANK_LATENCY_BUDGET_MS, batch_size=RERANK_BATCH_SIZE):
+        self.bi_encoder = bi_encoder
+        self.documents = list(documents)
+        self.reranker = reranker
+        self.reranker_tokenizer = reranker_tokenizer
+        self.top_n = top_n
+        self.latency_budget_ms = latency_budget_ms
+        self.batch_size = batch_size
+        self.last_timings = {}
+        self.doc_embeddings = np.asarray(bi_encoder.encode(self.documents, normalize_embeddings=True))
+
+    @classmethod
+    def load(cls, documents, embeddings_dir=EMBEDDINGS_MODEL_DIR, reranker_dir=RERANKER_MODEL_DIR, **kwargs):
+        """Load the trained bi-encoder and, when present, the trained reranker"""
+        from sentence_transformers import SentenceTransformer
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        bi_encoder = SentenceTransformer(str(embeddings_dir))
+        reranker = tokenizer = None
+        if Path(reranker_dir).exists():
+            tokenizer = AutoTokenizer.from_pretrained(str(reranker_dir))
+            reranker = AutoModelForSequenceClassification.from_pretrained(str(reranker_dir))
+            reranker.eval()
+        return cls(bi_encoder, documents, reranker, tokenizer, **kwargs)
+
+    def recall(self, query, n):
+        """Top-n (document index, cosine similarity) pairs from the bi-encoder"""
+        query_embedding = np.asarray(self.bi_encoder.encode(query, normalize_embeddings=True))
+        scores = self.doc_embeddings @ query_embedding
+        n = min(n, len(scores))
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def rerank_scores(self, query, doc_ids):
+        """Cross-encoder relevance probabilities for (query, document) pairs"""
+        import torch
+
+        inputs = self.reranker_tokenizer(
+            [query] * len(doc_ids), [self.documents[i] for i in doc_ids],
+            return_tensors="pt", truncation=True, padding=True, max_length=RERANKER_MAX_LENGTH,
+        )
+        with torch.no_grad():
+            logits = self.reranker(**inputs).logits.squeeze(-1)
+        return torch.sigmoid(logits).numpy().reshape(-1)
+
+    def search(self, query, k=10, rerank=True):
+        """Return the top-k hits; timings for the call are left in self.last_timings"""
+        start = time.perf_counter()
+        candidates = self.recall(query, max(k, self.top_n) if rerank else k)
+        recall_ms = (time.perf_counter() - start) * 1000
+
+        reranked = {}
+        rerank_ms = 0.0
+        if rerank and self.reranker is not None:
+            rerank_start = time.perf_counter()
+            head = [doc for doc, _ in candidates[:self.top_n]]
+            last_batch_ms = 0.0
+            for offset in range(0, len(head), self.batch_size):
+                # Skip the next batch if it would likely overrun the budget
+                elapsed_ms = (time.perf_counter() - rerank_start) * 1000
+                if offset and elapsed_ms + last_batch_ms > self.latency_budget_ms:
+                    break
+                batch_start = time.perf_counter()
+                batch = head[offset:offset + self.batch_size]
+                reranked.update(zip(batch, self.rerank_scores(query, batch)))
+                last_batch_ms = (time.perf_counter() - batch_start) * 1000
+            rerank_ms = (time.perf_counter() - rerank_start) * 1000
+
+        hits = [
+            {
+                "index": doc,
+                "document": self.documents[doc],
+                "dense_score": dense_score,
+                "rerank_score": float(reranked[doc]) if doc in reranked else None,
+            }
+            for doc, dense_score in candidates
+        ]
+        # Reranked candidates first by cross-encoder score, the rest keep bi-encoder order
+        hits.sort(key=lambda hit: (hit["rerank_score"] is None, -(hit["rerank_score"] or 0.0)))
+        self.last_timings = {
+            "recall_ms": recall_ms,
+            "rerank_ms": rerank_ms,
+            "reranked": len(reranked),
+            "budget_exhausted": rerank and self.reranker is not None and len(reranked) < min(self.top_n, len(candidates)),
+        }
+        return hits[:k]
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords (no stemming, so names match exactly)"""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked lists of document ids; returns [(doc id, fused score)] best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class BM25Index:
+    """Inverted index with BM25 weights precomputed per posting"""
+
+    def __init__(self, documents, postings, idf, sources=None, k1=BM25_K1, b=BM25_B):
+        self.documents = documents
+        self.postings = postings
+        self.idf = idf
+        self.sources = sources or {}
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def build(cls, documents, sources=None, k1=BM25_K1, b=BM25_B):
+        """Index documents ({"title", "snippet", "type", "text"} dicts)"""
+        term_counts = [Counter(tokenize(doc["text"])) for doc in documents]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+        document_frequency = Counter()
+        for counts in term_counts:
+            document_frequency.update(counts.keys())
+        n_docs = len(documents)
+        idf = {
+            term: math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+        postings = {}
+        for doc_id, counts in enumerate(term_counts):
+            norm = k1 * (1 - b + b * lengths[doc_id] / avg_length)
+            for term, tf in counts.items():
+                doc_ids, weights = postings.setdefault(term, ([], []))
+                doc_ids.append(doc_id)
+                weights.append(round(idf[term] * tf * (k1 + 1) / (tf + norm), 4))
+        return cls(documents, postings, idf, sources, k1, b)
+
+    @classmethod
+    def load(cls, index_file=SEARCH_INDEX_FILE):
+        """Load an index written by save()"""
+        with open(index_file, "r", encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["documents"], data["postings"], data["idf"], data.get("sources"), data["k1"], data["b"])
+
+    def save(self, index_file=SEARCH_INDEX_FILE):
+        """Write the index as compact JSON"""
+        Path(index_file).parent.mkdir(parents=True, exist_ok=True)
+        with open(index_file, "w", encoding='utf-8') as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "sources": self.sources,
+                "documents": self.documents,
+                "idf": self.idf,
+                "postings": self.postings,
+            }, f, ensure_ascii=False, separators=(",", ":"))
+
+    def search(self, query, k=10):
+        """Top-k (document id, BM25 score) pairs, walking only the query terms' postings"""
+        scores = {}
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, weights = self.postings[term]
+            for doc, weight in zip(doc_ids, weights):
+                scores[doc] = scores.get(doc, 0.0) + weight
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+class HybridRetriever:
+    """BM25 and dense retrieval over the same documents, fused with reciprocal rank fusion"""
+
+    def __init__(self, index, dense=None, candidates=FUSION_CANDIDATES, rrf_k=RRF_K):
+        self.index = index
+        self.dense = dense
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    @classmethod
+    def load(cls, index_file=SEARCH_INDEX_FILE, embeddings_dir=EMBEDDINGS_MODEL_DIR, **kwargs):
+        """Load the BM25 index and, when the embeddings model exists, a dense retriever over it"""
+        index = BM25Index.load(index_file)
+        dense = None
+        if Path(embeddings_dir).exists():
+            dense = TwoStageRetriever.load([doc["text"] for doc in index.documents], embeddings_dir=embeddings_dir)
+        return cls(index, dense, **kwargs)
+
+    def search(self, query, k=10, rerank=False):
+        """Top-k documents with their fused score and per-ranker ranks"""
+        sparse = [doc for doc, _ in self.index.search(query, self.candidates)]
+        rankings = [sparse]
+        dense = []
+        if self.dense is not None:
+            dense = [hit["index"] for hit in self.dense.search(query, k=self.candidates, rerank=rerank)]
+            rankings.append(dense)
+
+        sparse_rank = {doc: rank + 1 for rank, doc in enumerate(sparse)}
+        dense_rank = {doc: rank + 1 for rank, doc in enumerate(dense)}
+        return [
+            dict(self.index.documents[doc], index=doc, score=score,
+                 bm25_rank=sparse_rank.get(doc), dense_rank=dense_rank.get(doc))
+            for doc, score in reciprocal_rank_fusion(rankings, self.rrf_k)[:k]
+        ]
@@ -0,0 +1,301 @@
+"""
+Run Profiler for YatriAI Training Scripts
+
+Records per-stage wall time, RSS (before / after / peak) and accumulated
+timers (e.g. tokenization vs forward pass), optionally with a torch profiler
+trace, and writes everything to a JSON file per run.
+
+Memory is read from the OS, which costs nothing while a stage runs. Python
+allocation tracing (tracemalloc) slows allocation-heavy stages several
+times over, so it only runs with --trace-allocations, as a separate pass:
+timings from that pass are flagged in the report and should not be compared
+with a plain --profile run.
+
+Usage (from a script):
+    profiler = RunProfiler("train_models", enabled=args.profile, torch_trace=args.torch_trace,
+                           trace_allocations=args.trace_allocations)
+    with profiler.stage("tokenize"):
+        ...
+    with profiler.timed("forward"):
+        ...
+    profiler.write()
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PROFILES_DIR = Path("profiles")
+TOP_ALLOCATIONS = 10
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None if unavailable)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter so the next peak_rss_mb() covers one stage (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable)"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS, kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+
+def smaps_memory_mb(pid="self"):
+    """RSS, PSS and shared/private split of a process from /proc/<pid>/smaps_rollup (Linux only)"""
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb", "Shared_Dirty": "shared_mb",
+              "Private_Clean": "private_mb", "Private_Dirty": "private_mb"}
+    memory = {"rss_mb": 0.0, "pss_mb": 0.0, "shared_mb": 0.0, "private_mb": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] += int(value.split()[0]) / 1024
+    except (OSError, ValueError):
+        return None
+    return memory
+
+
+class RunProfiler:
+    """Collects profiling data for one script run. All methods are no-ops when disabled."""
+
+    def __init__(self, script_name, enabled=False, torch_trace=False, trace_allocations=False,
+                 output_dir=PROFILES_DIR):
+        self.script_name = script_name
+        self.enabled = enabled
+        self.torch_trace = enabled and torch_trace
+        self.trace_allocations = enabled and trace_allocations
+        self.output_dir = Path(output_dir)
+        self.started_at = datetime.now()
+        self.run_id = f"{script_name}-{self.started_at.strftime('%Y%m%d-%H%M%S')}"
+        self.stages = []
+        self.timers = {}
+        self.metrics = {}
+        self.traces = []
+        self._start = time.perf_counter()
+        self._open_peaks = []  # Running peak RSS of each open (possibly nested) stage
+        self._run_peak = 0.0
+
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            print("[profile] Tracing Python allocations: stage timings include tracemalloc overhead")
+
+    @contextmanager
+    def stage(self, name):
+        """Profile a top-level stage: wall time, RSS and (with trace_allocations) Python allocation peak"""
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+        # Resetting the counter would lose the enclosing stages' peak so far: fold it in first.
+        # Without a reset (non-Linux), the peak is the process high-water mark so far
+        self._fold_peak(peak_rss_mb())
+        peak_is_per_stage = reset_peak_rss()
+        self._open_peaks.append(0.0)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start
+            stage_peak = max(self._open_peaks.pop(), peak_rss_mb() or 0.0) or None
+            self._fold_peak(stage_peak)
+            record = {
+                "name": name,
+                "wall_time_s": wall_time,
+                "rss_before_mb": rss_before,
+                "rss_after_mb": current_rss_mb(),
+                "peak_rss_mb": stage_peak,
+                "peak_rss_scope": "stage" if peak_is_per_stage else "process",
+            }
+            if self.trace_allocations:
+                record["python_alloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            self.stages.append(record)
+            note = " (under tracemalloc)" if self.trace_allocations else ""
+            print(f"[profile] {name}: {wall_time:.2f}s{note}")
+
+    def _fold_peak(self, peak):
+        """Raise the run's and every open stage's peak RSS to `peak`"""
+        if peak is None:
+            return
+        self._run_peak = max(self._run_peak, peak)
+        self._open_peaks = [max(open_peak, peak) for open_peak in self._open_peaks]
+
+    @contextmanager
+    def timed(self, name):
+        """Accumulate time spent in a repeated section (e.g. per-batch tokenization)"""
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer = self.timers.setdefault(name, {"total_s": 0.0, "calls": 0})
+            timer["total_s"] += time.perf_counter() - start
+            timer["calls"] += 1
+
+    def wrap_timed(self, name, fn):
+        """Wrap a callable so every call is accumulated under timer `name`"""
+        if not self.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self.timed(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def wrap_method(self, obj, method_names, name):
+        """Time the first method of `obj` that exists (handles renamed library APIs)"""
+        for method_name in method_names:
+            if hasattr(obj, method_name):
+                setattr(obj, method_name, self.wrap_timed(name, getattr(obj, method_name)))
+                return
+
+    @contextmanager
+    def torch_profile(self, name):
+        """Capture a torch profiler trace (only when --torch-trace is set)"""
+        if not self.torch_trace:
+            yield
+            return
+
+        try:
+            from torch.profiler import profile, ProfilerActivity
+        except ImportError:
+            print("WARNING: torch profiler unavailable, skipping trace")
+            yield
+            return
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        trace_file = self.output_dir / f"{self.run_id}-{name}.trace.json"
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield
+        prof.export_chrome_trace(str(trace_file))
+        self.traces.append(str(trace_file))
+        print(f"[profile] torch trace saved to: {trace_file}")
+
+    def record(self, name, value):
+        """Record an arbitrary metric (counts, sizes, throughput)"""
+        if self.enabled:
+            self.metrics[name] = value
+
+    def top_allocations(self, limit=TOP_ALLOCATIONS):
+        """Largest live Python allocations grouped by source line"""
+        if not tracemalloc.is_tracing():
+            return []
+
+        snapshot = tracemalloc.take_snapshot()
+        return [
+            {
+                "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                "size_mb": stat.size / (1024 * 1024),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+
+    def write(self):
+        """Write the run profile to profiles/<script>-<timestamp>.json"""
+        if not self.enabled:
+            return None
+
+        report = {
+            "run_id": self.run_id,
+            "script": self.script_name,
+            "argv": sys.argv,
+            "started_at": self.started_at.isoformat(),
+            "total_wall_time_s": time.perf_counter() - self._start,
+            "peak_rss_mb": max(self._run_peak, peak_rss_mb() or 0.0) or None,
+            "timings_under_tracemalloc": self.trace_allocations,
+            "stages": self.stages,
+            "timers": self.timers,
+            "metrics": self.metrics,
+            "top_allocations": self.top_allocations(),
+            "torch_traces": self.traces,
+            "python_version": sys.version.split()[0],
+        }
+        try:
+            import torch
+            report["torch_version"] = torch.__version__
+            report["torch_threads"] = torch.get_num_threads()
+        except ImportError:
+            pass
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        output_file = self.output_dir / f"{self.run_id}.json"
+        with open(output_file, "w", encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        print(f"Profile saved to: {output_file}")
+        if self.trace_allocations:
+            print("[profile] Timings were taken under tracemalloc; rerun without --trace-allocations to time stages")
+        return output_file
+
+
+def add_profile_arguments(parser):
+    """Add the shared --profile / --torch-trace flags to an argparse parser"""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record per-stage timing and memory to profiles/<script>-<timestamp>.json"
+    )
+    parser.add_argument(
+        "--torch-trace",
+        action="store_true",
+        help="With --profile, also capture a torch profiler trace (adds overhead)"
+    )
+    parser.add_argument(
+        "--trace-allocations",
+        action="store_true",
+        help="With --profile, trace Python allocations with tracemalloc (slows stages; run separately from timing)"
+    )
@@ -0,0 +1,68 @@
+"""
+Tests for the tokenized dataset cache (scripts/token_cache.py)
+
+Usage:
+    python -m pytest scripts/tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("tokenizers")
+pytest.importorskip("transformers")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from token_cache import tokenize_cached  # noqa: E402
+
+TEXTS = ["plan a trip to kolkata", "book a heritage guide", "temples in kolkata"]
+
+
+@pytest.fixture
+def tokenizer():
+    """Word-level fast tokenizer over the test vocabulary (no download)"""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    words = sorted({word for text in TEXTS + ["hotels", "near"] for word in text.split()})
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(words)}}
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=backend, pad_token="[PAD]", unk_token="[UNK]")
+
+
+def test_hit_matches_live_tokenization(tokenizer, tmp_path):
+    tokenized = tokenize_cached(TEXTS, tokenizer, max_length=16, cache_dir=tmp_path)
+    inputs = tokenized.lookup(TEXTS[:2])
+    expected = tokenizer(TEXTS[:2], return_tensors="pt", padding=True)
+
+    assert isinstance(inputs["input_ids"], torch.Tensor)
+    assert torch.equal(inputs["input_ids"], expected["input_ids"])
+    assert torch.equal(inputs["attention_mask"], expected["attention_mask"])
+
+
+def test_miss_falls_back_to_torch_tensors(tokenizer, tmp_path):
+    tokenized = tokenize_cached(TEXTS, tokenizer, max_length=16, cache_dir=tmp_path)
+    texts = ["hotels near kolkata", TEXTS[0]]
+    inputs = tokenized.lookup(texts)
+    expected = tokenizer(texts, return_tensors="pt", padding=True)
+
+    assert tokenized.rows(texts)[0] is None
+    assert isinstance(inputs["input_ids"], torch.Tensor)
+    assert torch.equal(inputs["input_ids"], expected["input_ids"])
+    # The fallback must be usable as model input as-is
+    embedding = torch.nn.Embedding(len(tokenizer), 4)
+    assert embedding(inputs["input_ids"]).shape[:2] == inputs["input_ids"].shape
+
+
+def test_old_entries_are_pruned(tokenizer, tmp_path):
+    for n in range(1, 4):
+        tokenize_cached(TEXTS[:n], tokenizer, max_length=16, cache_dir=tmp_path, keep=2)
+
+    entries = [path for path in tmp_path.iterdir() if (path / "meta.json").exists()]
+    assert len(entries) == 2
+    # The entry just built is always kept
+    assert tokenize_cached(TEXTS, tokenizer, max_length=16, cache_dir=tmp_path, keep=2).directory in entries
@@ -0,0 +1,237 @@
+"""
+Tokenized Dataset Cache for YatriAI
+
+Training and evaluation tokenize the same data files on every run.
+tokenize_cached() tokenizes a list of texts once, shard by shard, and saves
+each shard as .npy files under models/token-cache/<fingerprint>/. The
+fingerprint covers the texts, the tokenizer (vocabulary and normalization
+rules) and max_length, so a run on unchanged data skips tokenization, and a
+change to any of them creates a new entry; only the MAX_CACHE_ENTRIES most
+recently used entries are kept. Shards are memory-mapped, so a
+batch only pages in the rows it uses and memory stays flat as datasets grow.
+
+Build the text list from the whole data file with source_texts(). The
+trainer and the evaluator then share one entry: the trainer selects its
+split's rows, and the evaluator reads every row.
+
+Usage:
+    texts = source_texts(TRAINING_DATA_DIR / "intent_data.json", ["text"])
+    tokenized = tokenize_cached(texts, tokenizer, max_length=128)
+    inputs = tokenized.lookup(["Plan a trip to Kolkata"])  # torch tensors, padded to the longest row
+    dataset = LabeledRows(tokenized, tokenized.rows(train_texts), labels)  # for the HF Trainer
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+TOKEN_CACHE_DIR = Path("models") / "token-cache"
+SHARD_ROWS = 4096
+CACHE_VERSION = 1
+MAX_CACHE_ENTRIES = 4  # Least recently used entries beyond this are deleted
+
+
+def source_texts(data_file, keys, extra_texts=()):
+    """Unique texts of a JSON list file under the given keys, in file order, then any extra texts"""
+    texts = {}
+    if Path(data_file).exists():
+        with open(data_file, "r", encoding='utf-8') as f:
+            for item in json.load(f):
+                for key in keys:
+                    texts.setdefault(item[key], None)
+    for text in extra_texts:
+        texts.setdefault(text, None)
+    return list(texts)
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Hash of everything that changes a tokenizer's output"""
+    digest = hashlib.sha256(type(tokenizer).__name__.encode("utf-8"))
+    if getattr(tokenizer, "is_fast", False):
+        # Vocabulary, normalizer, pre-tokenizer and post-processor; padding and
+        # truncation are per-call state the serialization would otherwise include
+        config = json.loads(tokenizer.backend_tokenizer.to_str())
+        config.pop("padding", None)
+        config.pop("truncation", None)
+        digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    else:
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+        digest.update(json.dumps(tokenizer.init_kwargs, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def cache_key(texts, tokenizer, max_length):
+    """Fingerprint of (texts, tokenizer, max_length)"""
+    digest = hashlib.sha256(f"v{CACHE_VERSION}:{max_length}:{tokenizer_fingerprint(tokenizer)}".encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+def _write_shards(directory, texts, tokenize_fn, max_length, pad_token_id):
+    """Tokenize texts shard by shard into directory; returns the cache metadata"""
+    keys, extras = None, {}
+    for shard, start in enumerate(range(0, len(texts), SHARD_ROWS)):
+        encoded = tokenize_fn(texts[start:start + SHARD_ROWS])
+        arrays = {}
+        for key, value in encoded.items():
+            value = value.numpy() if hasattr(value, "numpy") else value
+            if isinstance(value, np.ndarray) and value.ndim == 2:
+                arrays[key] = value[:, :max_length]
+            elif isinstance(value, (str, int, float, bool)):
+                extras[key] = value  # e.g. sentence-transformers' "modality"
+        keys = keys or sorted(arrays)
+        for key in keys:
+            # Pad every shard to max_length so rows from any shard stack together
+            padded = np.full((len(arrays[key]), max_length), pad_token_id if key == "input_ids" else 0, dtype=np.int32)
+            padded[:, :arrays[key].shape[1]] = arrays[key]
+            np.save(directory / f"{key}-{shard:05d}.npy", padded)
+    return {
+        "version": CACHE_VERSION,
+        "rows": len(texts),
+        "max_length": max_length,
+        "shard_rows": SHARD_ROWS,
+        "shards": (len(texts) + SHARD_ROWS - 1) // SHARD_ROWS,
+        "keys": keys or [],
+        "extras": extras,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def prune_cache(cache_dir=TOKEN_CACHE_DIR, keep=MAX_CACHE_ENTRIES, current=None):
+    """Delete all but the `keep` most recently used complete entries (always keeping current)"""
+    entries = sorted(
+        (path for path in Path(cache_dir).glob("*/meta.json") if ".tmp-" not in path.parent.name),
+        key=lambda path: (path.parent == current, path.stat().st_mtime),
+        reverse=True,
+    )
+    for meta_file in entries[keep:]:
+        shutil.rmtree(meta_file.parent, ignore_errors=True)
+        print(f"Removed stale tokenization cache: {meta_file.parent}")
+
+
+def tokenize_cached(texts, tokenizer, max_length=128, tokenize_fn=None, cache_dir=TOKEN_CACHE_DIR,
+                    keep=MAX_CACHE_ENTRIES):
+    """Memory-mapped tokenization of texts, built on the first call for this fingerprint"""
+    texts = list(texts)
+    default_fn = lambda chunk: tokenizer(chunk, truncation=True, padding=True, max_length=max_length, return_tensors="np")  # noqa: E731
+    tokenize_fn = tokenize_fn or default_fn
+    directory = Path(cache_dir) / cache_key(texts, tokenizer, max_length)
+
+    if (directory / "meta.json").exists():
+        os.utime(directory / "meta.json")  # Mark as recently used for prune_cache()
+        print(f"Using cached tokenization: {directory} ({len(texts)} texts)")
+        return TokenizedTexts(directory, texts, tokenize_fn)
+
+    start = time.perf_counter()
+    # Build in a private directory and rename it into place, so concurrent
+    # workers never read a partial cache (the loser of the rename discards its copy)
+    building = directory.with_name(f"{directory.name}.tmp-{os.getpid()}")
+    shutil.rmtree(building, ignore_errors=True)
+    building.mkdir(parents=True)
+    meta = _write_shards(building, texts, tokenize_fn, max_length, tokenizer.pad_token_id or 0)
+    meta["tokenizer"] = getattr(tokenizer, "name_or_path", "")
+    with open(building / "meta.json", "w", encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    try:
+        os.rename(building, directory)
+    except OSError:
+        shutil.rmtree(building, ignore_errors=True)
+    print(f"Tokenized {len(texts)} texts in {(time.perf_counter() - start) * 1000:.0f}ms, cached at {directory}")
+    prune_cache(cache_dir, keep, current=directory)
+    return TokenizedTexts(directory, texts, tokenize_fn)
+
+
+class TokenizedTexts:
+    """Read-only view of a cache entry; rows are gathered from memory-mapped shards"""
+
+    def __init__(self, directory, texts, tokenize_fn=None):
+        self.directory = Path(directory)
+        with open(self.directory / "meta.json", "r", encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.texts = texts
+        self.tokenize_fn = tokenize_fn
+        self.shards = {
+            key: [np.load(self.directory / f"{key}-{shard:05d}.npy", mmap_mode="r") for shard in range(self.meta["shards"])]
+            for key in self.meta["keys"]
+        }
+        self._row_of = None
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def rows(self, texts):
+        """Row id of each text (None for texts not in the cache)"""
+        if self._row_of is None:
+            self._row_of = {text: row for row, text in enumerate(self.texts)}
+        return [self._row_of.get(text) for text in texts]
+
+    def take(self, rows, trim=True):
+        """{key: int64 array [len(rows), width]}; trimmed to the longest row unless trim=False"""
+        rows = np.asarray(rows, dtype=np.int64)
+        shard_ids = rows // self.meta["shard_rows"]
+        batch = {}
+        for key, shards in self.shards.items():
+            out = np.empty((len(rows), self.meta["max_length"]), dtype=np.int64)
+            for shard in np.unique(shard_ids):
+                selected = shard_ids == shard
+                out[selected] = shards[shard][rows[selected] - shard * self.meta["shard_rows"]]
+            batch[key] = out
+        if trim and "attention_mask" in batch and len(rows):
+            width = max(1, int(batch["attention_mask"].sum(axis=1).max()))
+            batch = {key: value[:, :width] for key, value in batch.items()}
+        return batch
+
+    def tensors(self, rows):
+        """take() as torch tensors, plus any constant fields the tokenizer returned"""
+        import torch
+
+        batch = {key: torch.from_numpy(value) for key, value in self.take(rows).items()}
+        batch.update(self.meta["extras"])
+        return batch
+
+    def lookup(self, texts):
+        """Model inputs (torch tensors) for texts; tokenizes live if any text is missing"""
+        import torch
+
+        rows = self.rows(texts)
+        if any(row is None for row in rows):
+            encoded = self.tokenize_fn(list(texts))
+            return {key: torch.from_numpy(value) if isinstance(value, np.ndarray) else value for key, value in encoded.items()}
+        return self.tensors(rows)
+
+    def cached_fn(self, fallback):
+        """Wrap a tokenize function (e.g. SentenceTransformer.preprocess) to serve cached texts"""
+        def tokenize(inputs, *args, **kwargs):
+            plain = not args and all(value is None for value in kwargs.values())
+            if plain and all(isinstance(text, str) for text in inputs):
+                rows = self.rows(inputs)
+                if all(row is not None for row in rows):
+                    return self.tensors(rows)
+            return fallback(inputs, *args, **kwargs)
+        return tokenize
+
+
+class LabeledRows:
+    """Map-style dataset of cached rows with labels, as the HF Trainer expects"""
+
+    def __init__(self, tokenized, rows, labels):
+        self.tokenized = tokenized
+        self.rows = rows
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        # Untrimmed max_length rows, matching padding="max_length"
+        item = {key: value[0] for key, value in self.tokenized.take([self.rows[index]], trim=False).items()}
+        item["labels"] = self.labels[index]
+        return item
@@ -2,27 +2,40 @@
 Training Scripts for YatriAI Custom Models
 
 This script provides training utilities for:
-1. Semantic Embeddings Model
+1. Semantic Embeddings Model (+ cross-encoder reranker for two-stage retrieval)
 2. Intent Classification Model
-3. Named Entity Recognition Model
+3. Named Entity Recognition Model (+ joint intent/entity model, one forward pass for both)
 4. Recommendation System
 5. Budget Estimation Model
 
 Usage:
     python scripts/train_models.py --model embeddings
     python scripts/train_models.py --model intent
+    python scripts/train_models.py --model reranker
     python scripts/train_models.py --model ner
+    python scripts/train_models.py --model joint
     python scripts/train_models.py --model recommendations
     python scripts/train_models.py --model budget
+    python scripts/train_models.py --model intent --profile [--torch-trace] [--trace-allocations]
+    python scripts/train_models.py --model all --incremental [--resume]
+    python scripts/train_models.py --model intent --workers 8 [--scaling-report]
+    python scripts/train_models.py --model intent --search --trials 16 --workers 4
 """
 
 import argparse
+import hashlib
 import json
 import os
+import random
+import shutil
 import sys
+import time
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Tuple
 
+from run_profiler import PROFILES_DIR, RunProfiler, add_profile_arguments
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     import io
@@ -32,6 +45,316 @@ if sys.platform == 'win32':
 TRAINING_DATA_DIR = Path("training_data")
 MODELS_DIR = Path("models")
 
+CHECKPOINTS_DIR = MODELS_DIR / "checkpoints"
+
+# Fraction of intent examples held out of training for confidence calibration
+CALIBRATION_HOLDOUT = 0.15
+
+# Incremental training: old examples replayed per new example, to prevent forgetting
+REPLAY_RATIO = 1.0
+REPLAY_MIN = 16
+
+# Default hyperparameters; `--search` picks them on evidence and records the
+# chosen config in models/<name>/manifest.json, which later runs read
+DEFAULT_HYPERPARAMS = {
+    "heritage-embeddings": {
+        "epochs": 5,
+        "learning_rate": 2e-5,
+        "batch_size": 16,
+        "warmup_steps": 10,
+        "weight_decay": 0.01,
+    },
+    "intent-classifier": {
+        "epochs": 5,
+        "learning_rate": 2e-5,
+        "batch_size": 16,
+        "warmup_steps": 10,
+        "weight_decay": 0.01,
+    },
+    "heritage-reranker": {
+        "epochs": 3,
+        "learning_rate": 2e-5,
+        "batch_size": 16,
+        "warmup_steps": 10,
+        "weight_decay": 0.01,
+    },
+    "joint-intent-ner": {
+        "epochs": 8,
+        "learning_rate": 5e-5,
+        "batch_size": 16,
+        "warmup_steps": 10,
+        "weight_decay": 0.01,
+        "tag_loss_weight": 1.0,
+    },
+}
+
+# Cross-encoder reranker: small MS MARCO model, fine-tuned on embedding_pairs.json
+# plus negatives mined from the bi-encoder's own top results
+RERANKER_BASE_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANKER_MINED_NEGATIVES = 3
+RERANKER_HOLDOUT = 0.2  # Fraction of queries kept out of training for evaluate_models.py
+RERANKER_DUPLICATE_SIM = 0.9  # Mined candidates this close to a known positive are not negatives
+RERANKER_MINED_WEIGHT = 0.5  # Loss weight of mined (unverified) negatives vs labeled pairs
+
+JOINT_BASE_MODEL = "distilbert-base-uncased"
+
+
+def load_manifest(name):
+    """Load models/<name>/manifest.json (empty dict if absent)"""
+    manifest_file = MODELS_DIR / name / "manifest.json"
+    if not manifest_file.exists():
+        return {}
+    with open(manifest_file, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def update_manifest(name, **fields):
+    """Merge fields into models/<name>/manifest.json"""
+    manifest = load_manifest(name)
+    manifest.update(fields)
+    (MODELS_DIR / name).mkdir(parents=True, exist_ok=True)
+    with open(MODELS_DIR / name / "manifest.json", "w", encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_training_config(name):
+    """Hyperparameters for a model: defaults overridden by the manifest's training_config"""
+    config = dict(DEFAULT_HYPERPARAMS[name])
+    config.update(load_manifest(name).get("training_config", {}))
+    return config
+
+
+def example_fingerprint(example):
+    """Stable short hash identifying a training example"""
+    payload = json.dumps(example, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def load_training_state(model_dir):
+    """Load the record of which examples an artifact was trained on (None if absent)"""
+    state_file = Path(model_dir) / "training_state.json"
+    if not state_file.exists():
+        return None
+    with open(state_file, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+
+def sample_replay(old_examples, count, label_key=None, seed=42):
+    """Sample a replay buffer of previously seen examples, stratified by label"""
+    rng = random.Random(seed)
+    if count >= len(old_examples):
+        return list(old_examples)
+    if not label_key:
+        return rng.sample(old_examples, count)
+    
+    by_label = {}
+    for example in old_examples:
+        by_label.setdefault(str(example[label_key]), []).append(example)
+    
+    # Round-robin over labels so small classes are still replayed
+    pools = [rng.sample(items, len(items)) for _, items in sorted(by_label.items())]
+    replay = []
+    while len(replay) < count:
+        for pool in pools:
+            if pool and len(replay) < count:
+                replay.append(pool.pop())
+    return replay
+
+
+def plan_training_run(name, examples, base_model, incremental=False, resume=False,
+                      replay_ratio=REPLAY_RATIO, label_key=None, holdout_fn=None, extra=None):
+    """
+    Decide what a training run starts from and trains on.
+    
+    - resume: continue an interrupted run from its checkpoints with the same data
+    - incremental: start from the last artifact in models/ and train only on
+      examples it has not seen, plus a replay buffer of old ones
+    - otherwise: full training from the base checkpoint
+    
+    Returns the run plan, or None when there is nothing new to train on.
+    """
+    model_dir = MODELS_DIR / name
+    checkpoint_dir = CHECKPOINTS_DIR / name
+    plan_file = checkpoint_dir / "run_plan.json"
+    
+    if plan_file.exists():
+        if resume:
+            with open(plan_file, "r", encoding='utf-8') as f:
+                plan = json.load(f)
+            plan["resume"] = True
+            print(f"Resuming interrupted {plan['mode']} run from {checkpoint_dir}")
+            return plan
+        print(f"WARNING: Discarding checkpoints of an interrupted run in {checkpoint_dir} (use --resume to continue it)")
+        shutil.rmtree(checkpoint_dir)
+    elif resume:
+        print("No interrupted run to resume, starting a new one")
+    
+    state = load_training_state(model_dir) if incremental else None
+    if incremental and state is None:
+        print(f"WARNING: No training state in {model_dir}, running full training instead")
+    
+    if state:
+        seen = set(state["seen"])
+        heldout = set(state.get("heldout", []))
+        new_examples = [e for e in examples if example_fingerprint(e) not in seen | heldout]
+        if not new_examples:
+            print("No new examples since the last run, nothing to train")
+            return None
+        old_examples = [e for e in examples if example_fingerprint(e) in seen]
+        n_replay = min(len(old_examples), max(REPLAY_MIN, round(replay_ratio * len(new_examples))))
+        replay = sample_replay(old_examples, n_replay, label_key)
+        print(f"Incremental run: {len(new_examples)} new examples + {len(replay)} replayed")
+        
+        plan = {
+            "mode": "incremental",
+            "base_model": str(model_dir),
+            "train": new_examples + replay,
+            "heldout_examples": None,
+            "new_examples": len(new_examples),
+            "replay_examples": len(replay),
+            "state": {
+                "base_model": state["base_model"],
+                "seen": sorted(seen | {example_fingerprint(e) for e in new_examples}),
+                "heldout": sorted(heldout),
+                "runs": state.get("runs", []),
+            },
+        }
+    else:
+        train_examples, heldout_examples = holdout_fn(examples) if holdout_fn else (examples, [])
+        plan = {
+            "mode": "full",
+            "base_model": base_model,
+            "train": train_examples,
+            "heldout_examples": heldout_examples,
+            "new_examples": len(train_examples),
+            "replay_examples": 0,
+            "state": {
+                "base_model": base_model,
+                "seen": sorted({example_fingerprint(e) for e in train_examples}),
+                "heldout": sorted({example_fingerprint(e) for e in heldout_examples}),
+                "runs": [],
+            },
+        }
+    
+    plan["resume"] = False
+    plan["hyperparams"] = load_training_config(name)
+    plan["extra"] = extra or {}
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    with open(plan_file, "w", encoding='utf-8') as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    return plan
+
+
+def finish_training_run(name, plan):
+    """Record what the saved artifact was trained on and drop the run's checkpoints"""
+    update_manifest(name, training_config=plan["hyperparams"])
+    state = dict(plan["state"])
+    state["runs"] = state["runs"] + [{
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "mode": plan["mode"],
+        "new_examples": plan["new_examples"],
+        "replay_examples": plan["replay_examples"],
+    }]
+    with open(MODELS_DIR / name / "training_state.json", "w", encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    shutil.rmtree(CHECKPOINTS_DIR / name, ignore_errors=True)
+
+
+def _free_port():
+    """Find a free localhost port for the process group rendezvous"""
+    import socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _distributed_entry(rank, world_size, port, worker_fn, args, timings):
+    """Per-process entry point: join the gloo process group, then train"""
+    os.environ.update({
+        "MASTER_ADDR": "127.0.0.1",
+        "MASTER_PORT": str(port),
+        "RANK": str(rank),
+        "LOCAL_RANK": str(rank),
+        "WORLD_SIZE": str(world_size),
+        "CUDA_VISIBLE_DEVICES": "",
+        # Lets the HF Trainer (via accelerate) pick up the multi-CPU process group
+        "ACCELERATE_USE_CPU": "true",
+    })
+    import torch
+    import torch.distributed as dist
+    
+    # Split the cores between workers instead of oversubscribing intra-op threads
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    try:
+        dist.barrier()
+        start = time.perf_counter()
+        worker_fn(rank, world_size, *args)
+        if rank == 0:
+            timings.put(time.perf_counter() - start)
+    finally:
+        dist.destroy_process_group()
+
+
+def run_training_workers(worker_fn, workers, plan, profiler=None):
+    """
+    Run worker_fn(rank, world_size, plan, profiler) in-process, or on `workers`
+    data-parallel CPU processes joined through the gloo backend.
+    
+    Returns the time rank 0 spent training, excluding process startup.
+    """
+    if workers <= 1:
+        start = time.perf_counter()
+        worker_fn(0, 1, plan, profiler)
+        return time.perf_counter() - start
+    
+    import torch.multiprocessing as mp
+    
+    print(f"Launching {workers} data-parallel workers (gloo backend)")
+    timings = mp.get_context("spawn").SimpleQueue()
+    # Worker processes are not profiled individually; the parent times the whole stage
+    mp.spawn(
+        _distributed_entry,
+        args=(workers, _free_port(), worker_fn, (plan, None), timings),
+        nprocs=workers,
+        join=True,
+    )
+    return timings.get()
+
+
+def measure_scaling(train_fn, max_workers, **kwargs):
+    """
+    Train with 1..max_workers processes and report data-parallel scaling efficiency.
+    
+    Efficiency is measured on rank 0's training time; wall time (including
+    worker startup and model loading) is reported alongside.
+    """
+    counts = sorted({1, max_workers} | {2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i < max_workers})
+    runs = []
+    for workers in counts:
+        print(f"\n--- Scaling run: {workers} worker(s) ---")
+        stats = train_fn(workers=workers, **kwargs)
+        if stats is None:
+            return None
+        runs.append(stats)
+    
+    baseline = runs[0]["train_examples"] / runs[0]["train_time_s"]
+    print(f"\n{'Workers':<10} {'Train (s)':<12} {'Wall (s)':<12} {'Examples/s':<14} {'Speedup':<10} {'Efficiency':<10}")
+    print("-" * 68)
+    for run in runs:
+        throughput = run["train_examples"] / run["train_time_s"]
+        run["examples_per_s"] = throughput
+        run["speedup"] = throughput / baseline
+        run["efficiency"] = run["speedup"] / run["workers"]
+        print(f"{run['workers']:<10} {run['train_time_s']:<12.2f} {run['wall_time_s']:<12.2f} {throughput:<14.1f} {run['speedup']:<10.2f} {run['efficiency']:<10.2f}")
+    
+    PROFILES_DIR.mkdir(exist_ok=True)
+    report_file = PROFILES_DIR / f"scaling-{train_fn.__name__}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(report_file, "w", encoding='utf-8') as f:
+        json.dump({"cpu_count": os.cpu_count(), "runs": runs}, f, indent=2)
+    print(f"Scaling report saved to: {report_file}")
+    return runs
+
 
 def prepare_embedding_data():
     """Prepare training data for semantic embeddings model"""
@@ -92,47 +415,121 @@ def prepare_embedding_data():
     return training_pairs
 
 
-def train_embeddings_model():
+def cache_embedding_tokenization(model, pairs):
+    """Serve the model's tokenization of the embedding pairs from the token cache"""
+    from token_cache import source_texts, tokenize_cached
+    
+    texts = source_texts(
+        TRAINING_DATA_DIR / "embedding_pairs.json", ["query", "document"],
+        extra_texts=[text for pair in pairs for text in (pair["query"], pair["document"])],
+    )
+    # sentence-transformers >= 5 tokenizes through preprocess(); older versions through tokenize()
+    method = "preprocess" if hasattr(model, "preprocess") else "tokenize"
+    original = getattr(model, method)
+    tokenized = tokenize_cached(texts, model.tokenizer, model.max_seq_length, tokenize_fn=original)
+    setattr(model, method, tokenized.cached_fn(original))
+
+
+def build_embeddings_trainer(model, pairs, hyperparams, output_dir, world_size=1, save_strategy="epoch",
+                             callbacks=None):
+    """SentenceTransformerTrainer (CosineSimilarityLoss) on pairs with the given hyperparameters
+    
+    Every worker count runs this same Trainer; with world_size > 1 it joins the
+    gloo process group as DDP, like the intent classifier's Trainer.
+    """
+    from datasets import Dataset
+    from sentence_transformers import SentenceTransformerTrainer, SentenceTransformerTrainingArguments, losses
+    
+    dataset = Dataset.from_dict({
+        "query": [pair["query"] for pair in pairs],
+        "document": [pair["document"] for pair in pairs],
+        "label": [float(pair["label"]) for pair in pairs],
+    })
+    training_args = SentenceTransformerTrainingArguments(
+        output_dir=str(output_dir),
+        num_train_epochs=hyperparams["epochs"],
+        per_device_train_batch_size=hyperparams["batch_size"],
+        save_strategy=save_strategy,
+        save_total_limit=1,
+        learning_rate=hyperparams["learning_rate"],
+        weight_decay=hyperparams["weight_decay"],
+        warmup_steps=hyperparams["warmup_steps"],
+        logging_steps=5,
+        ddp_backend="gloo" if world_size > 1 else None,
+    )
+    return SentenceTransformerTrainer(
+        model=model,
+        args=training_args,
+        train_dataset=dataset,
+        loss=losses.CosineSimilarityLoss(model),
+        callbacks=callbacks,
+    )
+
+
+def _fit_embeddings_worker(rank, world_size, plan, profiler=None):
+    """Fit the embeddings model on one worker (the whole job when world_size == 1)"""
+    from sentence_transformers import SentenceTransformer
+    from transformers.trainer_utils import get_last_checkpoint
+    
+    profiler = profiler or RunProfiler("train_embeddings")
+    checkpoint_dir = CHECKPOINTS_DIR / "heritage-embeddings"
+    output_dir = MODELS_DIR / "heritage-embeddings"
+    
+    # Load base model (or the last trained artifact when running incrementally)
+    with profiler.stage("embeddings.load_model"):
+        model = SentenceTransformer(plan["base_model"])
+    # Before building the Trainer: its data collator keeps a reference to preprocess()
+    with profiler.stage("embeddings.tokenize_cache"):
+        cache_embedding_tokenization(model, plan["train"])
+    # Time tokenization separately from the forward pass
+    profiler.wrap_method(model, ["preprocess", "tokenize"], "embeddings.tokenize")
+    
+    trainer = build_embeddings_trainer(model, plan["train"], plan["hyperparams"], checkpoint_dir, world_size=world_size)
+    
+    resume_checkpoint = get_last_checkpoint(str(checkpoint_dir)) if plan["resume"] else None
+    with profiler.torch_profile("embeddings.train"):
+        trainer.train(resume_from_checkpoint=resume_checkpoint)
+    
+    # Save model (rank 0 only when data-parallel)
+    if trainer.is_world_process_zero():
+        with profiler.stage("embeddings.save"):
+            model.save(str(output_dir))
+
+
+def train_embeddings_model(profiler=None, incremental=False, resume=False, replay_ratio=REPLAY_RATIO, workers=1):
     """Train semantic embeddings model using sentence-transformers"""
     try:
-        from sentence_transformers import SentenceTransformer, InputExample, losses
-        from torch.utils.data import DataLoader
+        import sentence_transformers  # noqa: F401
+        import torch  # noqa: F401
     except ImportError:
         print("❌ Please install required packages:")
         print("   pip install sentence-transformers torch")
         return
     
     print("Training semantic embeddings model...")
+    profiler = profiler or RunProfiler("train_embeddings")
     
     # Prepare data
-    training_pairs = prepare_embedding_data()
-    
-    # Load base model
-    model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-    
-    # Prepare training examples
-    train_examples = [
-        InputExample(texts=[pair["query"], pair["document"]], label=pair["label"])
-        for pair in training_pairs
-    ]
-    
-    # Create data loader
-    train_dataloader = DataLoader(train_examples, shuffle=True, batch_size=16)
+    with profiler.stage("embeddings.load_data"):
+        training_pairs = prepare_embedding_data()
     
-    # Define loss function
-    train_loss = losses.CosineSimilarityLoss(model)
+    plan = plan_training_run(
+        "heritage-embeddings", training_pairs, 'sentence-transformers/all-MiniLM-L6-v2',
+        incremental=incremental, resume=resume, replay_ratio=replay_ratio, label_key="label",
+    )
+    if plan is None:
+        return
     
-    # Train model with improved parameters
     MODELS_DIR.mkdir(exist_ok=True)
-    model.fit(
-        train_objectives=[(train_dataloader, train_loss)],
-        epochs=5,  # Increased from 3 to 5
-        output_path=str(MODELS_DIR / "heritage-embeddings"),
-        show_progress_bar=True,
-        warmup_steps=10,  # Add warmup for better convergence
-    )
+    start = time.perf_counter()
+    with profiler.stage("embeddings.train"):
+        train_time = run_training_workers(_fit_embeddings_worker, workers, plan, profiler)
+    wall_time = time.perf_counter() - start
+    profiler.record("embeddings.train_examples", len(plan["train"]))
+    finish_training_run("heritage-embeddings", plan)
     
     print(f"SUCCESS: Model trained and saved to: {MODELS_DIR / 'heritage-embeddings'}")
+    return {"train_time_s": train_time, "wall_time_s": wall_time, "train_examples": len(plan["train"]), "workers": workers}
 
 
 def prepare_intent_data():
@@ -169,100 +566,518 @@ def prepare_intent_data():
     return training_data
 
 
-def train_intent_classifier():
+def split_calibration_holdout(training_data, fraction=CALIBRATION_HOLDOUT, seed=42):
+    """Split off a stratified held-out set used to calibrate classifier confidences"""
+    rng = random.Random(seed)
+    by_intent = {}
+    for item in training_data:
+        by_intent.setdefault(item["intent"], []).append(item)
+    
+    train_split, heldout_split = [], []
+    for intent in sorted(by_intent):
+        items = list(by_intent[intent])
+        rng.shuffle(items)
+        # Keep at least 3 training examples per intent
+        n_heldout = max(0, min(max(1, round(len(items) * fraction)), len(items) - 3))
+        heldout_split.extend(items[:n_heldout])
+        train_split.extend(items[n_heldout:])
+    
+    return train_split, heldout_split
+
+
+def build_intent_trainer(model, tokenizer, training_data, intent_to_id, hyperparams, output_dir,
+                         world_size=1, save_strategy="epoch", callbacks=None, profiler=None):
+    """HF Trainer for the intent classifier on training_data with the given hyperparameters"""
+    from transformers import Trainer, TrainingArguments
+    from token_cache import LabeledRows, source_texts, tokenize_cached
+    
+    profiler = profiler or RunProfiler("train_intent")
+    # Tokenize the whole data file once (cached, shared with evaluate_models.py)
+    # and train on this run's rows of it
+    with profiler.stage("intent.tokenize"):
+        train_texts = [item["text"] for item in training_data]
+        texts = source_texts(TRAINING_DATA_DIR / "intent_data.json", ["text"], extra_texts=train_texts)
+        tokenized = tokenize_cached(texts, tokenizer, max_length=128)
+        tokenized_dataset = LabeledRows(
+            tokenized, tokenized.rows(train_texts), [intent_to_id[item["intent"]] for item in training_data]
+        )
+    
+    # Training arguments (see DEFAULT_HYPERPARAMS / the manifest's training_config)
+    training_args = TrainingArguments(
+        output_dir=str(output_dir),
+        num_train_epochs=hyperparams["epochs"],
+        per_device_train_batch_size=hyperparams["batch_size"],
+        save_strategy=save_strategy,
+        save_total_limit=1,
+        learning_rate=hyperparams["learning_rate"],
+        weight_decay=hyperparams["weight_decay"],
+        warmup_steps=hyperparams["warmup_steps"],
+        logging_steps=5,
+        ddp_backend="gloo" if world_size > 1 else None,
+    )
+    
+    # Time forward+backward steps separately from the rest of the training loop
+    model.forward = profiler.wrap_timed("intent.forward", model.forward)
+    
+    return Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=tokenized_dataset,
+        callbacks=callbacks,
+    )
+
+
+def _fit_intent_worker(rank, world_size, plan, profiler=None):
+    """Fit the intent classifier on one worker (the whole job when world_size == 1)"""
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    from transformers.trainer_utils import get_last_checkpoint
+    
+    profiler = profiler or RunProfiler("train_intent")
+    model_dir = MODELS_DIR / "intent-classifier"
+    checkpoint_dir = CHECKPOINTS_DIR / "intent-classifier"
+    training_data = plan["train"]
+    intent_to_id = plan["extra"]["intent_to_id"]
+    
+    # Load model and tokenizer (or the last trained artifact when running incrementally)
+    model_name = plan["base_model"]
+    with profiler.stage("intent.load_model"):
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_name,
+            num_labels=len(intent_to_id)
+        )
+    
+    trainer = build_intent_trainer(
+        model, tokenizer, training_data, intent_to_id, plan["hyperparams"], checkpoint_dir,
+        world_size=world_size, profiler=profiler,
+    )
+    
+    # Train
+    resume_checkpoint = get_last_checkpoint(str(checkpoint_dir)) if plan["resume"] else None
+    with profiler.torch_profile("intent.train"):
+        trainer.train(resume_from_checkpoint=resume_checkpoint)
+    
+    # Save model (rank 0 only when data-parallel)
+    if trainer.is_world_process_zero():
+        with profiler.stage("intent.save"):
+            model.save_pretrained(model_dir)
+            tokenizer.save_pretrained(model_dir)
+
+
+def train_intent_classifier(calibration_holdout=CALIBRATION_HOLDOUT, profiler=None,
+                            incremental=False, resume=False, replay_ratio=REPLAY_RATIO, workers=1):
     """Train intent classification model"""
     try:
-        from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments
-        from datasets import Dataset
+        import transformers  # noqa: F401
+        import torch  # noqa: F401
     except ImportError:
         print("❌ Please install required packages:")
-        print("   pip install transformers datasets torch")
+        print("   pip install transformers torch")
         return
     
     print("Training intent classification model...")
+    profiler = profiler or RunProfiler("train_intent")
     
     # Prepare data
-    training_data = prepare_intent_data()
+    with profiler.stage("intent.load_data"):
+        training_data = prepare_intent_data()
     
     # Get unique intents
     intents = sorted(set(item["intent"] for item in training_data))
     intent_to_id = {intent: idx for idx, intent in enumerate(intents)}
+    model_dir = MODELS_DIR / "intent-classifier"
     
-    # Load model and tokenizer
-    model_name = "distilbert-base-uncased"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(
-        model_name,
-        num_labels=len(intents)
+    # Incremental runs keep the existing label ids; a new intent needs a new head
+    mapping_file = model_dir / "intent_mapping.json"
+    if incremental and mapping_file.exists():
+        with open(mapping_file, "r", encoding='utf-8') as f:
+            previous_mapping = json.load(f)["intent_to_id"]
+        if set(intents) - set(previous_mapping):
+            print("WARNING: New intents found, running full training instead of incremental")
+            incremental = False
+        else:
+            intent_to_id = previous_mapping
+    
+    # Hold out examples the model never sees, for calibration in evaluate_models.py
+    def holdout_fn(examples):
+        if calibration_holdout <= 0:
+            return examples, []
+        train_split, heldout_split = split_calibration_holdout(examples, calibration_holdout)
+        print(f"Holding out {len(heldout_split)} examples for calibration")
+        return train_split, heldout_split
+    
+    plan = plan_training_run(
+        "intent-classifier", training_data, "distilbert-base-uncased",
+        incremental=incremental, resume=resume, replay_ratio=replay_ratio,
+        label_key="intent", holdout_fn=holdout_fn, extra={"intent_to_id": intent_to_id},
     )
+    if plan is None:
+        return
+    training_data = plan["train"]
+    intent_to_id = plan["extra"]["intent_to_id"]
     
-    # Prepare dataset with labels
-    def prepare_examples(examples):
-        texts = examples["text"]
-        labels = [intent_to_id[examples["intent"][i]] for i in range(len(texts))]
-        return {"text": texts, "label": labels}
+    MODELS_DIR.mkdir(exist_ok=True)
+    start = time.perf_counter()
+    with profiler.stage("intent.train"):
+        train_time = run_training_workers(_fit_intent_worker, workers, plan, profiler)
+    wall_time = time.perf_counter() - start
+    profiler.record("intent.train_examples", len(training_data))
     
-    # Prepare dataset
-    def tokenize_function(examples):
-        return tokenizer(examples["text"], truncation=True, padding="max_length", max_length=128)
+    # Save intent mapping
+    with open(model_dir / "intent_mapping.json", "w") as f:
+        json.dump({"intent_to_id": intent_to_id, "id_to_intent": {v: k for k, v in intent_to_id.items()}}, f, indent=2)
     
-    dataset = Dataset.from_list(training_data)
-    # Add labels
-    dataset = dataset.map(lambda x: {"label": intent_to_id[x["intent"]]})
-    tokenized_dataset = dataset.map(tokenize_function, batched=True)
+    # Save held-out split for calibration (incremental runs keep the original split)
+    if plan["heldout_examples"] is not None:
+        with open(model_dir / "heldout_data.json", "w", encoding='utf-8') as f:
+            json.dump(plan["heldout_examples"], f, indent=2, ensure_ascii=False)
     
-    # Training arguments with improved settings
-    training_args = TrainingArguments(
-        output_dir=str(MODELS_DIR / "intent-classifier"),
-        num_train_epochs=5,  # Increased from 3 to 5
-        per_device_train_batch_size=16,
-        save_strategy="epoch",
-        learning_rate=2e-5,  # Explicit learning rate
-        weight_decay=0.01,  # Add regularization
-        warmup_steps=10,  # Add warmup
-        logging_steps=5,
-    )
+    finish_training_run("intent-classifier", plan)
     
-    # Trainer
-    trainer = Trainer(
-        model=model,
-        args=training_args,
-        train_dataset=tokenized_dataset,
+    print(f"SUCCESS: Model trained and saved to: {model_dir}")
+    return {"train_time_s": train_time, "wall_time_s": wall_time, "train_examples": len(training_data), "workers": workers}
+
+
+def split_reranker_holdout(training_pairs, fraction=RERANKER_HOLDOUT, seed=42):
+    """Split pairs by query, so no held-out query (or its documents' labels) is seen in training"""
+    rng = random.Random(seed)
+    # Only queries with a relevant document can be scored by MRR / nDCG
+    queries = sorted({p["query"] for p in training_pairs if p["label"] >= 0.5})
+    rng.shuffle(queries)
+    heldout_queries = set(queries[:round(len(queries) * fraction)])
+    train_split = [p for p in training_pairs if p["query"] not in heldout_queries]
+    heldout_split = [p for p in training_pairs if p["query"] in heldout_queries]
+    return train_split, heldout_split
+
+
+def mine_hard_negatives(training_pairs, documents, negatives_per_query=RERANKER_MINED_NEGATIVES,
+                        duplicate_sim=RERANKER_DUPLICATE_SIM):
+    """Highest-ranked unlabeled documents per query under the current bi-encoder
+    
+    Unlabeled is not the same as irrelevant: candidates that are near-duplicates
+    of one of the query's positives are skipped rather than used as negatives.
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    embeddings_dir = MODELS_DIR / "heritage-embeddings"
+    bi_encoder = SentenceTransformer(str(embeddings_dir) if embeddings_dir.exists() else 'sentence-transformers/all-MiniLM-L6-v2')
+    
+    doc_ids = {doc: i for i, doc in enumerate(documents)}
+    known, positives = {}, {}
+    for pair in training_pairs:
+        known.setdefault(pair["query"], set()).add(pair["document"])
+        if pair["label"] >= 0.5:
+            positives.setdefault(pair["query"], []).append(doc_ids[pair["document"]])
+    queries = sorted(known)
+    
+    doc_embeddings = bi_encoder.encode(documents, normalize_embeddings=True)
+    query_embeddings = bi_encoder.encode(queries, normalize_embeddings=True)
+    similarities = query_embeddings @ doc_embeddings.T
+    doc_similarities = doc_embeddings @ doc_embeddings.T
+    
+    negatives = []
+    skipped = 0
+    for q, query in enumerate(queries):
+        mined = 0
+        for d in similarities[q].argsort()[::-1]:
+            if mined == negatives_per_query:
+                break
+            # Skip documents already labeled for this query (positive or negative)
+            if documents[d] in known[query]:
+                continue
+            if positives.get(query) and doc_similarities[d, positives[query]].max() >= duplicate_sim:
+                skipped += 1
+                continue
+            negatives.append({"query": query, "document": documents[d], "label": 0.0, "weight": RERANKER_MINED_WEIGHT})
+            mined += 1
+    if skipped:
+        print(f"Skipped {skipped} mined candidates that duplicate a positive")
+    return negatives
+
+
+def train_reranker_model(profiler=None, negatives_per_query=RERANKER_MINED_NEGATIVES, holdout=RERANKER_HOLDOUT):
+    """Train a cross-encoder reranker for the bi-encoder's top-N candidates"""
+    try:
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification, get_linear_schedule_with_warmup
+        import sentence_transformers  # noqa: F401
+    except ImportError:
+        print("❌ Please install required packages:")
+        print("   pip install sentence-transformers transformers torch")
+        return
+    
+    print("Training cross-encoder reranker...")
+    profiler = profiler or RunProfiler("train_reranker")
+    model_dir = MODELS_DIR / "heritage-reranker"
+    
+    with profiler.stage("reranker.mine_negatives"):
+        all_pairs = prepare_embedding_data()
+        training_pairs, heldout_pairs = split_reranker_holdout(all_pairs, holdout)
+        print(f"Holding out {len({p['query'] for p in heldout_pairs})} queries ({len(heldout_pairs)} pairs) for evaluation")
+        # Any document can be a candidate; only training queries' labels are used
+        documents = sorted(set(p["document"] for p in all_pairs))
+        mined = mine_hard_negatives(training_pairs, documents, negatives_per_query)
+    examples = training_pairs + mined
+    print(f"Training examples: {len(examples)} ({len(mined)} mined negatives, weight {RERANKER_MINED_WEIGHT})")
+    
+    hyperparams = load_training_config("heritage-reranker")
+    tokenizer = AutoTokenizer.from_pretrained(RERANKER_BASE_MODEL)
+    model = AutoModelForSequenceClassification.from_pretrained(RERANKER_BASE_MODEL, num_labels=1)
+    
+    batch_size = hyperparams["batch_size"]
+    total_steps = hyperparams["epochs"] * ((len(examples) + batch_size - 1) // batch_size)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=hyperparams["learning_rate"], weight_decay=hyperparams["weight_decay"])
+    scheduler = get_linear_schedule_with_warmup(optimizer, hyperparams["warmup_steps"], total_steps)
+    loss_fn = torch.nn.BCEWithLogitsLoss(reduction="none")
+    rng = random.Random(42)
+    
+    start = time.perf_counter()
+    with profiler.stage("reranker.train"):
+        model.train()
+        for epoch in range(hyperparams["epochs"]):
+            order = rng.sample(examples, len(examples))
+            epoch_loss = 0.0
+            for offset in range(0, len(order), batch_size):
+                batch = order[offset:offset + batch_size]
+                inputs = tokenizer(
+                    [p["query"] for p in batch], [p["document"] for p in batch],
+                    return_tensors="pt", truncation=True, padding=True, max_length=256,
+                )
+                labels = torch.tensor([p["label"] for p in batch], dtype=torch.float)
+                weights = torch.tensor([p.get("weight", 1.0) for p in batch], dtype=torch.float)
+                loss = (loss_fn(model(**inputs).logits.squeeze(-1), labels) * weights).sum() / weights.sum()
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                scheduler.step()
+                epoch_loss += loss.item() * len(batch)
+            print(f"   Epoch {epoch + 1}/{hyperparams['epochs']}: loss {epoch_loss / len(examples):.4f}")
+    train_time = time.perf_counter() - start
+    profiler.record("reranker.train_examples", len(examples))
+    
+    model_dir.mkdir(parents=True, exist_ok=True)
+    model.save_pretrained(str(model_dir))
+    tokenizer.save_pretrained(str(model_dir))
+    # Held-out queries for evaluate_models.py (scored against the full document set)
+    with open(model_dir / "heldout_data.json", "w", encoding='utf-8') as f:
+        json.dump(heldout_pairs, f, indent=2, ensure_ascii=False)
+    update_manifest(
+        "heritage-reranker",
+        base_model=RERANKER_BASE_MODEL,
+        training_config=hyperparams,
+        train_examples=len(examples),
+        mined_negatives=len(mined),
+        heldout_pairs=len(heldout_pairs),
+        trained_at=datetime.now().isoformat(timespec="seconds"),
     )
     
-    # Train
-    trainer.train()
+    print(f"SUCCESS: Model trained and saved to: {model_dir}")
+    return {"train_time_s": train_time, "train_examples": len(examples)}
+
+
+def prepare_joint_data():
+    """Intent examples plus retrieval queries (tagging head only), all with silver entity spans"""
+    from joint_model import silver_entity_spans
     
-    # Save model
-    model.save_pretrained(MODELS_DIR / "intent-classifier")
-    tokenizer.save_pretrained(MODELS_DIR / "intent-classifier")
+    examples = [
+        {"text": item["text"], "intent": item["intent"], "spans": silver_entity_spans(item["text"])}
+        for item in prepare_intent_data()
+    ]
     
-    # Save intent mapping
-    with open(MODELS_DIR / "intent-classifier" / "intent_mapping.json", "w") as f:
-        json.dump({"intent_to_id": intent_to_id, "id_to_intent": {v: k for k, v in intent_to_id.items()}}, f, indent=2)
+    # Catalog queries mention sites and cities far more often than intent examples do
+    seen = {example["text"] for example in examples}
+    pairs_file = TRAINING_DATA_DIR / "embedding_pairs.json"
+    if pairs_file.exists():
+        with open(pairs_file, "r", encoding='utf-8') as f:
+            queries = sorted(set(pair["query"] for pair in json.load(f)) - seen)
+        examples.extend(
+            {"text": query, "intent": None, "spans": silver_entity_spans(query)}
+            for query in queries
+        )
+    
+    tagged = sum(1 for example in examples if example["spans"])
+    print(f"Joint examples: {len(examples)} ({tagged} with entities, "
+          f"{sum(1 for e in examples if e['intent'] is None)} tagging-only)")
+    return examples
+
+
+def train_joint_model(profiler=None, calibration_holdout=CALIBRATION_HOLDOUT):
+    """Train one encoder with an intent head and an entity tagging head"""
+    try:
+        import torch
+        from transformers import AutoTokenizer, AutoModel, get_linear_schedule_with_warmup
+    except ImportError:
+        print("❌ Please install required packages:")
+        print("   pip install transformers torch")
+        return
+    from joint_model import IGNORE_INDEX, JOINT_MODEL_DIR, MAX_LENGTH, JointIntentEntityModel, tag_offsets
+    
+    print("Training joint intent + entity model...")
+    profiler = profiler or RunProfiler("train_joint")
+    
+    with profiler.stage("joint.load_data"):
+        examples = prepare_joint_data()
+    intents = sorted(set(e["intent"] for e in examples if e["intent"] is not None))
+    intent_to_id = {intent: idx for idx, intent in enumerate(intents)}
+    
+    # Same stratified held-out split as the intent classifier, plus the same fraction
+    # of entity-bearing tagging-only queries, for evaluate_models.py
+    intent_examples = [e for e in examples if e["intent"] is not None]
+    tagging_only = [e for e in examples if e["intent"] is None and e["spans"]]
+    heldout_split = []
+    if calibration_holdout > 0:
+        _, heldout_split = split_calibration_holdout(intent_examples, calibration_holdout)
+        heldout_split += random.Random(42).sample(tagging_only, round(len(tagging_only) * calibration_holdout))
+    held_texts = {e["text"] for e in heldout_split}
+    train_examples = [e for e in examples if e["text"] not in held_texts]
+    print(f"Training on {len(train_examples)} examples, holding out {len(heldout_split)}")
+    
+    hyperparams = load_training_config("joint-intent-ner")
+    tokenizer = AutoTokenizer.from_pretrained(JOINT_BASE_MODEL)
+    model = JointIntentEntityModel(AutoModel.from_pretrained(JOINT_BASE_MODEL), len(intent_to_id))
+    
+    # Tokenize once; tag labels come from each token's character offsets
+    with profiler.stage("joint.tokenize"):
+        encoded = tokenizer([e["text"] for e in train_examples], truncation=True,
+                            max_length=MAX_LENGTH, return_offsets_mapping=True)
+        tag_labels = [tag_offsets(offsets, e["spans"]) for offsets, e in zip(encoded["offset_mapping"], train_examples)]
+        intent_labels = [intent_to_id[e["intent"]] if e["intent"] is not None else IGNORE_INDEX for e in train_examples]
+    
+    batch_size = hyperparams["batch_size"]
+    total_steps = hyperparams["epochs"] * ((len(train_examples) + batch_size - 1) // batch_size)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=hyperparams["learning_rate"], weight_decay=hyperparams["weight_decay"])
+    scheduler = get_linear_schedule_with_warmup(optimizer, hyperparams["warmup_steps"], total_steps)
+    rng = random.Random(42)
+    
+    start = time.perf_counter()
+    with profiler.stage("joint.train"):
+        model.train()
+        for epoch in range(hyperparams["epochs"]):
+            order = rng.sample(range(len(train_examples)), len(train_examples))
+            epoch_loss = 0.0
+            for offset in range(0, len(order), batch_size):
+                batch = order[offset:offset + batch_size]
+                padded = tokenizer.pad({"input_ids": [encoded["input_ids"][i] for i in batch]}, return_tensors="pt")
+                width = padded["input_ids"].shape[1]
+                tags = torch.tensor([tag_labels[i] + [IGNORE_INDEX] * (width - len(tag_labels[i])) for i in batch])
+                intent_logits, tag_logits = model(padded["input_ids"], padded["attention_mask"])
+                loss = model.loss(intent_logits, tag_logits, torch.tensor([intent_labels[i] for i in batch]),
+                                  tags, hyperparams["tag_loss_weight"])
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                scheduler.step()
+                epoch_loss += loss.item() * len(batch)
+            print(f"   Epoch {epoch + 1}/{hyperparams['epochs']}: loss {epoch_loss / len(train_examples):.4f}")
+    train_time = time.perf_counter() - start
+    profiler.record("joint.train_examples", len(train_examples))
+    
+    model.save(JOINT_MODEL_DIR, tokenizer, intent_to_id, JOINT_BASE_MODEL)
+    with open(JOINT_MODEL_DIR / "heldout_data.json", "w", encoding='utf-8') as f:
+        json.dump([{"text": e["text"], "intent": e["intent"]} for e in heldout_split], f, indent=2, ensure_ascii=False)
+    update_manifest(
+        "joint-intent-ner",
+        base_model=JOINT_BASE_MODEL,
+        training_config=hyperparams,
+        train_examples=len(train_examples),
+        trained_at=datetime.now().isoformat(timespec="seconds"),
+    )
     
-    print(f"SUCCESS: Model trained and saved to: {MODELS_DIR / 'intent-classifier'}")
+    print(f"SUCCESS: Model trained and saved to: {JOINT_MODEL_DIR}")
+    return {"train_time_s": train_time, "train_examples": len(train_examples)}
 
 
 def main():
     parser = argparse.ArgumentParser(description="Train YatriAI custom models")
     parser.add_argument(
         "--model",
-        choices=["embeddings", "intent", "ner", "recommendations", "budget", "all"],
+        choices=["embeddings", "intent", "reranker", "ner", "joint", "recommendations", "budget", "all"],
         required=True,
         help="Model to train"
     )
+    parser.add_argument(
+        "--calibration-holdout",
+        type=float,
+        default=CALIBRATION_HOLDOUT,
+        help="Fraction of intent examples held out for confidence calibration (0 to disable)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Continue from the last artifact in models/, training only on new examples plus a replay buffer"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from its checkpoints in models/checkpoints/"
+    )
+    parser.add_argument(
+        "--replay-ratio",
+        type=float,
+        default=REPLAY_RATIO,
+        help="Old examples replayed per new example in incremental runs"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Data-parallel CPU worker processes (torch distributed, gloo backend); with --search, concurrent trials"
+    )
+    parser.add_argument(
+        "--scaling-report",
+        action="store_true",
+        help="Train with 1..--workers processes and report scaling efficiency"
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="Run a hyperparameter search and write the chosen config to models/<name>/manifest.json"
+    )
+    parser.add_argument(
+        "--trials",
+        type=int,
+        default=12,
+        help="Number of hyperparameter search trials"
+    )
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
+    profiler = RunProfiler("train_models", enabled=args.profile, torch_trace=args.torch_trace,
+                           trace_allocations=args.trace_allocations)
+    continual = {"incremental": args.incremental, "resume": args.resume, "replay_ratio": args.replay_ratio}
+    
+    if args.search:
+        from hparam_search import run_search
+        if args.model in ("embeddings", "all"):
+            run_search("heritage-embeddings", trials=args.trials, workers=args.workers)
+        if args.model in ("intent", "all"):
+            run_search("intent-classifier", trials=args.trials, workers=args.workers)
+        return
     
     if args.model == "embeddings" or args.model == "all":
-        train_embeddings_model()
+        if args.scaling_report:
+            measure_scaling(train_embeddings_model, args.workers, profiler=profiler)
+        else:
+            train_embeddings_model(profiler=profiler, workers=args.workers, **continual)
     
     if args.model == "intent" or args.model == "all":
-        train_intent_classifier()
+        if args.scaling_report:
+            measure_scaling(train_intent_classifier, args.workers,
+                            calibration_holdout=args.calibration_holdout, profiler=profiler)
+        else:
+            train_intent_classifier(calibration_holdout=args.calibration_holdout, profiler=profiler,
+                                    workers=args.workers, **continual)
+    
+    # After the embeddings model, so negatives are mined with the fine-tuned bi-encoder
+    if args.model == "reranker" or args.model == "all":
+        train_reranker_model(profiler=profiler)
     
     if args.model == "ner":
         print("WARNING: NER training not yet implemented. Use rule-based extraction for now.")
+        print("   --model joint trains entity tagging together with intents.")
+    
+    if args.model == "joint" or args.model == "all":
+        train_joint_model(profiler=profiler, calibration_holdout=args.calibration_holdout)
     
     if args.model == "recommendations":
         print("⚠️  Recommendation system uses collaborative filtering - no training needed.")
@@ -271,6 +1086,8 @@ def main():
     if args.model == "budget":
         print("⚠️  Budget estimation uses rule-based model - no training needed.")
         print("   Can be improved with historical booking data.")
+    
+    profiler.write()
 
 
 if __name__ == "__main__":